@@ -0,0 +1,331 @@
+import argparse
+import json
+import os
+import socket
+import sys
+from functools import partial
+import pandas as pd
+from tqdm import tqdm
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(ROOT, 'football_scraper'))
+sys.path.append(os.path.join(ROOT, 'nba_scraper'))
+from competitions import competitions
+from Scraper_FBREF import EXTRACTOR_NAMES, FBREFScraper, comp_schedule_url, match_played
+from Scraper_FBREF import GAMES_SCHEMA as FBREF_GAMES_SCHEMA
+from games_scraper import GAMES_SCHEMA as NBA_GAMES_SCHEMA
+from games_scraper import GamesScraper, clean_games
+from players_scraper import PLAYERS_SCHEMA, PlayerLogScraper
+from season_calendar import SeasonCalendar
+from scraping_utils.artifact_cache import ArtifactCache
+from scraping_utils.fetcher import Fetcher
+from scraping_utils.html_tables import BACKENDS
+from scraping_utils.ledger import LEDGER
+from scraping_utils.metrics import METRICS, SectionTimings, export_metrics
+from scraping_utils.page_cache import OfflineCacheMiss, PageCache
+from scraping_utils.parse_pool import ParsePool
+from scraping_utils.schemas import apply_schema
+from scraping_utils.sinks import write_parquet
+from scraping_utils.store import SqliteStore
+from scraping_utils.work_queue import WorkQueue
+
+# Scrapes whole histories of several competitions as a queue of pages that workers split between them.
+#
+#   python batch_scraper.py plan job.json --queue queue.sqlite --shards 4
+#   python batch_scraper.py work --queue queue.sqlite --shard 0     (one worker per IP, shards 0 to 3)
+#   python batch_scraper.py merge queue.sqlite [other machines' queues...] --output-dir output
+#
+# The job spec names the competitions and seasons of every sport:
+#   {"fbref": {"leagues": ["Copa Libertadores"], "seasons": [2022, 2023], "stats": ["possession"]},
+#    "nba": {"seasons": [2023, 2024], "players": true}}
+#
+# Schedules are planned first, scraping one adds its match reports or box scores to the same shard,
+# so a shard is a set of competition seasons and machines working on their own copy of the queue
+# never need each other's state. Merged outputs are sorted, whichever worker scraped every page.
+
+NBA_SEASON_URL = 'https://www.basketball-reference.com/leagues/NBA_{season}_games.html'
+NBA_GAMES_DTYPES = {**NBA_GAMES_SCHEMA, 'date': 'datetime64[ns]', 'datetime': 'datetime64[ns]', 'timestamp': 'Int64'}
+
+
+def records(df):
+    # Rows as json, like the checkpoints
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+def error_text(exc):
+    return f'{type(exc).__name__}: {exc}'
+
+class PageError:
+    # Result of a page whose parser raised, so one bad page fails its task instead of stopping the worker
+    def __init__(self, exc):
+        self.error = error_text(exc)
+
+def guarded_parse(parse, content, *args, timings=None):
+    # Module level so parse worker processes can run it
+    try:
+        return parse(content, *args, timings=timings)
+    except Exception as exc:
+        return PageError(exc)
+
+def plan_tasks(spec):
+    # Schedule tasks of the job spec, their pages are added to the queue once they are scraped
+    tasks = []
+    fbref = spec.get('fbref')
+    if fbref:
+        unknown = [league for league in fbref['leagues'] if league not in competitions]
+        if unknown:
+            raise ValueError(f'Unknown leagues {unknown}, add them to competitions.py')
+        unknown = set(fbref.get('stats') or []) - set(EXTRACTOR_NAMES)
+        if unknown:
+            raise ValueError(f'Unknown stats {sorted(unknown)}, available stats are {EXTRACTOR_NAMES}')
+        tasks += [('fbref_schedule', comp_schedule_url(league, season), {'league': league, 'season': season})
+                  for league in fbref['leagues'] for season in fbref['seasons']]
+    nba = spec.get('nba')
+    if nba:
+        tasks += [('nba_season', NBA_SEASON_URL.format(season=season), {'season': season}) for season in nba['seasons']]
+    return tasks
+
+
+class BatchWorker:
+    # Claims tasks of one shard until the queue has none left
+    def __init__(self, queue, spec, fetcher, shard=None, worker=None, backend='lxml', parse_workers=0, calendar=None, batch=50, artifacts=None):
+        self.queue = queue
+        self.spec = spec
+        self.fetcher = fetcher
+        self.shard = shard
+        self.worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+        self.backend = backend
+        self.calendar = calendar if calendar is not None else SeasonCalendar()
+        self.batch = batch
+        self.artifacts = artifacts
+        self.stats = (spec.get('fbref') or {}).get('stats')
+        self.timings = SectionTimings()
+        self.parse_pool = ParsePool(workers=parse_workers, timings=self.timings)
+
+    def fbref_schedule(self, task):
+        scraper = FBREFScraper(seasons=[], leagues=[], fetcher=self.fetcher, backend=self.backend, stats=self.stats)
+        scraper.timings = self.timings
+        games = scraper.get_comp_games(league=task['args']['league'], season=task['args']['season'])
+        if games is None:
+            return None, []
+        # Only played matches have a report, fixtures link to head-to-head pages until then
+        return records(games), [('match_report', url, {}) for url in games.loc[games['Score'].map(match_played), 'Match Report']]
+
+    def nba_season(self, task):
+        scraper = GamesScraper(season=task['args']['season'], fetcher=self.fetcher, backend=self.backend, calendar=self.calendar)
+        scraper.timings = self.timings
+        scraper.run()
+        if scraper.games.empty:
+            return None, []
+        games = clean_games(scraper.games)
+        pages = []
+        if self.spec['nba'].get('players', True):
+            pages = [('boxscore', row['boxscore'], {'away_code': row['away_code'], 'home_code': row['home_code'], 'season': int(row['season'])})
+                     for _, row in games[games['boxscore'].notna()].iterrows()]
+        return records(games), pages
+
+    def run_schedules(self, tasks):
+        for task in tasks:
+            try:
+                result, pages = getattr(self, task['kind'])(task)
+            except OfflineCacheMiss:
+                self.queue.fail(task['url'], 'not cached')
+                continue
+            except Exception as exc:
+                # Tried again until the queue's attempt limit gives it up
+                self.queue.fail(task['url'], error_text(exc))
+                continue
+            if result is None:
+                self.queue.fail(task['url'], 'no games found')
+                continue
+            self.queue.add(pages, shard=task['shard'], stage=task['stage'] + 1, parent=task['url'])
+            self.queue.complete(task['url'], result)
+
+    def run_pages(self, kind, tasks):
+        def fetch(task):
+            url = task['url']
+            lap = self.timings.laps()
+            try:
+                req = self.fetcher.get(url)
+            except OfflineCacheMiss:
+                self.queue.fail(url, 'not cached')
+                return task, None, ()
+            except Exception as exc:
+                self.queue.fail(url, error_text(exc))
+                return task, None, ()
+            lap('fetch')
+            if req.status_code != 200:
+                self.queue.fail(url, f'status {req.status_code}', req.status_code)
+                return task, None, ()
+            if kind == 'match_report':
+                return task, req.content, (url, self.backend, self.stats, self.artifacts)
+            args = task['args']
+            return task, req.content, (url, args['away_code'], args['home_code'], args['season'], self.backend, self.artifacts)
+
+        parse = partial(guarded_parse, FBREFScraper.parse_stats if kind == 'match_report' else PlayerLogScraper.parse_match_players)
+        pages = self.fetcher.map(fetch, tasks)
+        for task, result in tqdm(self.parse_pool.map(parse, pages), total=len(tasks), desc=f'Shard {self.shard} {kind}'):
+            if result is None:
+                continue
+            if isinstance(result, PageError):
+                self.queue.fail(task['url'], result.error)
+                continue
+            self.queue.complete(task['url'], result if kind == 'match_report' else records(result))
+
+    def run(self):
+        try:
+            while True:
+                tasks = self.queue.claim(self.worker, self.shard, self.batch)
+                if not tasks:
+                    break
+                self.run_schedules([task for task in tasks if task['stage'] == 0])
+                for kind in ['match_report', 'boxscore']:
+                    kind_tasks = [task for task in tasks if task['kind'] == kind]
+                    if kind_tasks:
+                        self.run_pages(kind, kind_tasks)
+        finally:
+            self.queue.release(self.worker)
+
+
+def merged_results(queues, kind):
+    # Results of every url, the first queue that finished it wins so the merge doesn't depend on timing
+    results = {}
+    for queue in queues:
+        for url, args, result in queue.results(kind):
+            results.setdefault(url, result)
+    return results
+
+def merge_fbref(queues, spec, lineups):
+    schedules = merged_results(queues, 'fbref_schedule')
+    if not schedules:
+        return None, None
+    games = pd.concat([pd.DataFrame(rows) for url, rows in sorted(schedules.items())], ignore_index=True)
+    games = apply_schema(games, FBREF_GAMES_SCHEMA)
+    games = games.sort_values(['league', 'season', 'Date', 'Match Report'], kind='stable').reset_index(drop=True)
+
+    reports = merged_results(queues, 'match_report')
+    scraper = FBREFScraper(seasons=[], leagues=[], lineups=lineups, stats=spec['fbref'].get('stats'))
+    scraper.games = games
+    scraper.add_stats([reports.get(url, {}) for url in games['Match Report']])
+    return scraper.games, scraper.match_players
+
+def merge_nba(queues):
+    seasons = merged_results(queues, 'nba_season')
+    if not seasons:
+        return None, None
+    games = pd.concat([pd.DataFrame(rows) for url, rows in sorted(seasons.items())], ignore_index=True)
+    games = apply_schema(games, NBA_GAMES_DTYPES)
+    games = games.sort_values(['date', 'boxscore'], kind='stable').reset_index(drop=True)
+
+    boxscores = merged_results(queues, 'boxscore')
+    scraper = PlayerLogScraper(games=None)
+    chunks = [scraper.finalize(PlayerLogScraper.with_game(row, pd.DataFrame(boxscores[row['boxscore']])))
+              for _, row in games.iterrows() if row['boxscore'] in boxscores]
+    players = apply_schema(pd.concat(chunks, ignore_index=True), PLAYERS_SCHEMA) if chunks else None
+    return games, players
+
+def save(df, path, store=None):
+    # The file name is also the table of the store
+    df.to_csv(path + '.csv', encoding='utf-8-sig', index=False)
+    write_parquet(df, path + '.parquet')
+    if store is not None:
+        store.upsert(os.path.basename(path), df)
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan = commands.add_parser('plan', help='Add the schedules of a job spec to the queue')
+    plan.add_argument('spec', help='Job spec, a json file with the competitions and seasons of every sport')
+    plan.add_argument('--queue', default='queue.sqlite')
+    plan.add_argument('--shards', type=int, default=1, help='Parts the work is split into, one per worker or machine')
+
+    work = commands.add_parser('work', help='Scrape the tasks of a shard until there are none left')
+    work.add_argument('--queue', default='queue.sqlite')
+    work.add_argument('--shard', type=int, help='Shard to work on, all of them if not given')
+    work.add_argument('--worker', help='Name of the worker in the queue, host and pid by default')
+    work.add_argument('--batch', type=int, default=50, help='Tasks claimed at a time')
+    work.add_argument('--lease', type=float, default=3600, help='Seconds after which tasks claimed by a worker that stopped are claimed again')
+    work.add_argument('--cache-dir', default='.page_cache')
+    work.add_argument('--offline', action='store_true', help='Replay pages from the cache only')
+    work.add_argument('--artifact-dir', default='.artifact_cache', help='Tables and sections read from every page, extracting new stats reads them instead of the pages')
+    work.add_argument('--backend', choices=BACKENDS, default='lxml', help='HTML parser used to read the pages')
+    work.add_argument('--calendar', default='season_calendar.json', help='Where to keep the month pages found for every NBA season')
+    work.add_argument('--parse-workers', type=int, default=os.cpu_count(), help='Processes that parse the pages, 0 parses them in the main process')
+    work.add_argument('--ledger', default='requests_ledger.csv', help='Where to save the report of requested pages (.csv or .parquet)')
+    work.add_argument('--metrics', default='metrics.jsonl', help='Where to export timings, counters and queue depths (.prom for the Prometheus text format)')
+
+    status = commands.add_parser('status', help='Print the tasks of every shard by status')
+    status.add_argument('--queue', default='queue.sqlite')
+
+    merge = commands.add_parser('merge', help='Build the outputs from the finished tasks of one or more queues')
+    merge.add_argument('queues', nargs='+', help='Queue files, e.g. the copies every machine worked on')
+    merge.add_argument('--output-dir', default='.')
+    merge.add_argument('--db', help='SQLite database the merged outputs are upserted into, only changed rows are written')
+    merge.add_argument('--lineups', choices=['wide', 'long'], default='wide', help='fbref lineups as columns of the games, or one row per player in fbref_match_players')
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        with open(args.spec, encoding='utf-8') as f:
+            spec = json.load(f)
+        queue = WorkQueue(args.queue)
+        if queue.get_meta('shards', args.shards) != args.shards:
+            parser.error(f'{args.queue} was planned with {queue.get_meta("shards")} shards')
+        queue.set_meta('shards', args.shards)
+        queue.set_meta('spec', spec)
+        added = queue.add(plan_tasks(spec))
+        print(f'{added} schedules added to {args.queue}')
+
+    elif args.command == 'work':
+        queue = WorkQueue(args.queue, lease=args.lease)
+        spec = queue.get_meta('spec')
+        if spec is None:
+            parser.error(f'{args.queue} has no job, run plan first')
+        worker = BatchWorker(
+            queue = queue,
+            spec = spec,
+            fetcher = Fetcher(cache=PageCache(path=args.cache_dir, offline=args.offline)),
+            shard = args.shard,
+            worker = args.worker,
+            backend = args.backend,
+            parse_workers = args.parse_workers,
+            calendar = SeasonCalendar(args.calendar),
+            batch = args.batch,
+            artifacts = ArtifactCache(args.artifact_dir)
+        )
+        worker.run()
+        print(queue.progress())
+
+        # Save report of requested pages, timings and request counters
+        LEDGER.save(args.ledger)
+        if LEDGER.duplicates():
+            print(f'--- {len(LEDGER.duplicates())} pages were requested more than once, see {args.ledger} ---')
+        export_metrics(args.metrics, worker.timings, METRICS)
+
+    elif args.command == 'status':
+        print(WorkQueue(args.queue).progress())
+
+    elif args.command == 'merge':
+        queues = [WorkQueue(path) for path in args.queues]
+        spec = queues[0].get_meta('spec') or {}
+        os.makedirs(args.output_dir, exist_ok=True)
+        store = SqliteStore(args.db) if args.db else None
+        if spec.get('fbref'):
+            games, match_players = merge_fbref(queues, spec, args.lineups)
+            if games is not None:
+                save(games, os.path.join(args.output_dir, 'fbref_games'), store)
+                if args.lineups == 'long':
+                    save(match_players, os.path.join(args.output_dir, 'fbref_match_players'), store)
+        if spec.get('nba'):
+            games, players = merge_nba(queues)
+            if games is not None:
+                save(games, os.path.join(args.output_dir, 'nba_games'), store)
+            if players is not None:
+                save(players, os.path.join(args.output_dir, 'nba_players'), store)
+        if store is not None:
+            store.close()
+        for queue in queues:
+            failed = queue.progress().get('failed')
+            if failed is not None and failed.sum():
+                print(f'--- {int(failed.sum())} tasks of {queue.path} failed, see its tasks table ---')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+from time import perf_counter
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nba_scraper'))
+from aux_functions import add_game_datetimes, assign_teams, assign_teams_vectorized, convert_time_format
+from teams import teams_dict
+
+# Compares the row-wise post processing of the NBA scrapers with the vectorized versions on a synthetic frame
+
+def synthetic_players(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    teams = np.array(list(teams_dict.values()))
+    return pd.DataFrame({
+        'home': rng.choice(teams, rows),
+        'away': rng.choice(teams, rows),
+        'home_pts': rng.integers(80, 140, rows),
+        'away_pts': rng.integers(80, 140, rows),
+        'is_home': rng.integers(0, 2, rows),
+    })
+
+def synthetic_games(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp('2022-10-18') + pd.to_timedelta(rng.integers(0, 240, rows), unit='D')
+    hours = rng.integers(1, 12, rows)
+    minutes = rng.choice([0, 30], rows)
+    return pd.DataFrame({
+        'date': days.strftime('%a, %b %d, %Y'),
+        'start_time': [f'{h}:{m:02d}{ampm}' for h, m, ampm in zip(hours, minutes, rng.choice(['p', 'a'], rows, p=[0.95, 0.05]))],
+    })
+
+def timed(func, *args):
+    start = perf_counter()
+    result = func(*args)
+    return result, perf_counter() - start
+
+def rowwise_games(games):
+    games = games.copy()
+    games['start_time'] = games['start_time'].apply(convert_time_format)
+    games['datetime'] = games['date'] + ' ' + games['start_time']
+    games['date'] = games['date'].apply(lambda x: datetime.strptime(x, "%a, %b %d, %Y"))
+    games['datetime'] = games['datetime'].apply(lambda x: datetime.strptime(x, "%a, %b %d, %Y %H:%M:%S"))
+    games['timestamp'] = games['datetime'].apply(lambda x: int(x.timestamp()))
+    return games
+
+def report(name, rows, sample, rowwise_func, vectorized_func, frame):
+    # The row-wise version is only timed on a sample, at 1M rows it takes hours
+    rowwise, rowwise_time = timed(rowwise_func, frame.head(sample))
+    vectorized, vectorized_time = timed(vectorized_func, frame.head(sample))
+    pd.testing.assert_frame_equal(rowwise, vectorized, check_dtype=False)
+    _, full_time = timed(vectorized_func, frame)
+
+    print(f'{name}: {sample} rows row-wise {rowwise_time:.2f}s, vectorized {vectorized_time:.3f}s ({rowwise_time / vectorized_time:.0f}x faster); '
+          f'{rows} rows vectorized {full_time:.2f}s')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--sample', type=int, default=10_000, help='Rows used to time the row-wise versions')
+    args = parser.parse_args()
+
+    report('assign_teams', args.rows, args.sample, lambda df: df.apply(assign_teams, axis=1), assign_teams_vectorized, synthetic_players(args.rows))
+    report('games dates', args.rows, args.sample, rowwise_games, add_game_datetimes, synthetic_games(args.rows))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import tracemalloc
+from time import perf_counter
+import pandas as pd
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'football_scraper'))
+sys.path.append(os.path.join(ROOT, 'nba_scraper'))
+from competitions import competitions
+from Scraper_FBREF import FBREFScraper
+from games_scraper import GamesScraper
+from players_scraper import PlayerLogScraper
+from scraping_utils.html_tables import BACKENDS
+from scraping_utils.page_cache import CachedResponse, PageCache
+
+# Parses a corpus of saved pages with the scrapers' parsing code, without network access.
+# The corpus is a directory with a manifest.csv (kind, url, file and the arguments the scrapers need)
+# and the gzipped pages. Build it from a page cache with --export-cache, benchmarks/corpus is a small
+# sample of every kind, built from the test fixtures, so the benchmark runs offline out of the box.
+
+KINDS = ['fbref_schedule', 'match_report', 'nba_schedule', 'boxscore']
+
+
+class CorpusFetcher:
+    # Serves saved pages in place of Fetcher
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, stale_ok=False):
+        if url in self.pages:
+            return CachedResponse(url, 200, self.pages[url], from_cache=True)
+        return CachedResponse(url, 404, b'', from_cache=True)
+
+    def map(self, func, items):
+        for item in items:
+            yield func(item)
+
+
+def page_kind(url):
+    if 'fbref.com' in url:
+        if '/schedule/' in url:
+            return 'fbref_schedule'
+        if '/matches/' in url:
+            return 'match_report'
+    elif 'basketball-reference.com' in url:
+        if re.search(r'NBA_\d+_games-', url):
+            return 'nba_schedule'
+        if '/boxscores/' in url:
+            return 'boxscore'
+
+def export_corpus(cache_dir, corpus_dir, games_path, per_kind):
+    cache = PageCache(cache_dir, offline=True)
+    leagues = {league_id: league for league, league_id in competitions.items()}
+    boxscores = pd.read_csv(games_path).set_index('boxscore') if games_path else None
+
+    os.makedirs(os.path.join(corpus_dir, 'pages'), exist_ok=True)
+    rows = []
+    counts = {kind: 0 for kind in KINDS}
+    for (url,) in cache.db.execute('SELECT url FROM pages ORDER BY url'):
+        kind = page_kind(url)
+        if kind is None or counts[kind] >= per_kind:
+            continue
+
+        row = {'kind': kind, 'url': url}
+        if kind == 'fbref_schedule':
+            league_id, season = re.search(r'/comps/(\d+)/(\d+)/schedule/', url).groups()
+            if int(league_id) not in leagues:
+                continue
+            row.update(league=leagues[int(league_id)], season=int(season))
+        elif kind == 'nba_schedule':
+            season, month = re.search(r'NBA_(\d+)_games-([a-z0-9-]+)\.html', url).groups()
+            row.update(season=int(season), month=month)
+        elif kind == 'boxscore':
+            if boxscores is None or url not in boxscores.index:
+                continue
+            game = boxscores.loc[url]
+            row.update(season=int(game['season']), away_code=game['away_code'], home_code=game['home_code'])
+
+        row['file'] = os.path.join('pages', hashlib.sha256(url.encode()).hexdigest()[:16] + '.html.gz')
+        with open(os.path.join(corpus_dir, row['file']), 'wb') as f:
+            f.write(gzip.compress(cache.cached(url).content))
+        rows.append(row)
+        counts[kind] += 1
+
+    pd.DataFrame(rows).to_csv(os.path.join(corpus_dir, 'manifest.csv'), index=False)
+    print(f'--- Exported {counts} pages to {corpus_dir} ---')
+
+def load_corpus(corpus_dir):
+    manifest = pd.read_csv(os.path.join(corpus_dir, 'manifest.csv'))
+    pages = {}
+    for _, row in manifest.iterrows():
+        with open(os.path.join(corpus_dir, row['file']), 'rb') as f:
+            pages[row['url']] = gzip.decompress(f.read())
+    return manifest, pages
+
+def parse_pages(kind, manifest, fetcher, backend):
+    # Runs the scraper method that parses every page of this kind, returns its section timings
+    if kind == 'fbref_schedule':
+        scraper = FBREFScraper(seasons=[], leagues=[], fetcher=fetcher, backend=backend)
+        for _, row in manifest.iterrows():
+            scraper.get_comp_games(league=row['league'], season=int(row['season']))
+    elif kind == 'match_report':
+        scraper = FBREFScraper(seasons=[], leagues=[], fetcher=fetcher, backend=backend)
+        for _, row in manifest.iterrows():
+            scraper.get_stats(row={'Match Report': row['url']})
+    elif kind == 'nba_schedule':
+        for _, row in manifest.iterrows():
+            scraper = GamesScraper(season=int(row['season']), fetcher=fetcher, backend=backend)
+            scraper.get_games(row['month'])
+    elif kind == 'boxscore':
+        scraper = PlayerLogScraper(games=None, fetcher=fetcher, backend=backend)
+        for _, row in manifest.iterrows():
+            scraper.get_match_players_stats(row['url'], row['away_code'], row['home_code'], int(row['season']))
+    return scraper.timings
+
+def bench_kind(kind, manifest, pages, backend, repeat):
+    manifest = manifest[manifest['kind'] == kind]
+    fetcher = CorpusFetcher(pages)
+    result = {'kind': kind, 'pages': len(manifest) * repeat}
+
+    # Error messages of the scrapers are not part of the benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = perf_counter()
+        timings = [parse_pages(kind, manifest, fetcher, backend) for _ in range(repeat)]
+        result['seconds'] = perf_counter() - start
+
+        # Peak memory is measured on a separate pass, tracemalloc slows down parsing
+        tracemalloc.start()
+        parse_pages(kind, manifest, fetcher, backend)
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+
+    result['pages_per_sec'] = result['pages'] / result['seconds']
+    sections = pd.concat([t.to_frame() for t in timings]).groupby('section', sort=False)[['calls', 'total_ms']].sum()
+    result['sections_ms'] = (sections['total_ms'] / sections['calls']).round(3).to_dict()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', default=os.path.join(ROOT, 'benchmarks', 'corpus'))
+    parser.add_argument('--backend', choices=BACKENDS, default='lxml')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='Save the results to this file')
+    parser.add_argument('--baseline', help='Results file of a previous run to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=1.25, help='Fail if pages/sec drops by more than this factor against the baseline')
+    parser.add_argument('--export-cache', help='Build the corpus from this page cache directory instead of running the benchmark')
+    parser.add_argument('--games', default=os.path.join(ROOT, 'nba_scraper', 'games.csv'), help='NBA games, used to find the teams of the exported box scores')
+    parser.add_argument('--per-kind', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.export_cache:
+        export_corpus(args.export_cache, args.corpus, args.games, args.per_kind)
+        return
+
+    manifest, pages = load_corpus(args.corpus)
+    results = [bench_kind(kind, manifest, pages, args.backend, args.repeat) for kind in KINDS if (manifest['kind'] == kind).any()]
+
+    for result in results:
+        print(f"{result['kind']:15} {result['pages']:5} pages  {result['pages_per_sec']:8.1f} pages/s  peak {result['peak_mb']:7.1f} MB")
+        for section, ms in result['sections_ms'].items():
+            print(f"    {section:20} {ms:9.3f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {result['kind']: result for result in json.load(f)}
+        regressions = [result['kind'] for result in results
+                       if result['kind'] in baseline and result['pages_per_sec'] * args.max_slowdown < baseline[result['kind']]['pages_per_sec']]
+        if regressions:
+            print(f'--- Parsing got slower than the baseline for {regressions} ---')
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
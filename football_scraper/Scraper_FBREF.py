@@ -1,478 +1,647 @@
 import pandas as pd
+import pyarrow as pa
 from bs4 import BeautifulSoup
-from lxml import etree
-import requests
-from time import sleep
-from random import random
-from requests.exceptions import RequestException
 import re
 import itertools
 from io import StringIO
 from tqdm import tqdm
 from competitions import competitions
+import argparse
+import os
+import sys
 import warnings
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraping_utils.artifact_cache import ArtifactCache
+from scraping_utils.checkpoint import CheckpointStore, since_date
+from scraping_utils.fetcher import Fetcher
+from scraping_utils.html_tables import BACKENDS, parse_html, read_table, table_columns, uncomment_tables
+from scraping_utils.ledger import LEDGER
+from scraping_utils.metrics import METRICS, SectionTimings, export_metrics
+from scraping_utils.page_cache import OfflineCacheMiss, PageCache
+from scraping_utils.parse_pool import ParsePool
+from scraping_utils.refresh_planner import RefreshPlanner
+from scraping_utils.schemas import apply_schema
+from scraping_utils.sinks import write_parquet
+from scraping_utils.store import SqliteStore
 warnings.filterwarnings('ignore')
 
+# Lineup columns look like starting_age_home7 or bench_goals_away4. fbref ages look like 27-123,
+# age keeps the years and age_days the days
+LINEUP_FIELDS = ['name', 'age', 'age_days', 'position', 'minutes', 'goals']
+# Cells of the player stats table read into the lineups, by data-stat
+PLAYER_CELLS = ['name', 'age', 'position', 'minutes', 'goals']
+LINEUP_SLOTS = {'starting': 14, 'bench': 12}
+LINEUP_COLUMNS = [role + '_' + field + '_' + side + str(slot)
+	for side in ['home', 'away']
+	for role, slots in LINEUP_SLOTS.items()
+	for slot in range(1, slots + 1)
+	for field in LINEUP_FIELDS]
+
+LINEUP_COLUMN = re.compile(r'^(starting|bench)_(' + '|'.join(LINEUP_FIELDS) + r')_(home|away)(\d+)$')
+
+# Long format lineups, one row per player and match
+MATCH_PLAYERS_COLUMNS = ['match_id', 'side', 'role', 'slot'] + LINEUP_FIELDS
+
+def split_age(players):
+	# 27-123 into 27 years and 123 days, ages already split are left as they are
+	if not pd.api.types.is_numeric_dtype(players['age']):
+		parts = players['age'].astype('string').str.extract(r'^(\d+)(?:-(\d+))?$')
+		players['age'], players['age_days'] = parts[0], parts[1]
+	return players
+
+# Compact dtypes of the outputs, applied as the frames are built
+LINEUP_DTYPES = {'name': 'category', 'age': 'Int16', 'age_days': 'Int16', 'position': 'category', 'minutes': 'Int16', 'goals': 'Int16'}
+MATCH_PLAYERS_SCHEMA = {'match_id': 'string', 'side': pd.CategoricalDtype(['home', 'away']),
+	'role': pd.CategoricalDtype(list(LINEUP_SLOTS)), 'slot': 'Int8', **LINEUP_DTYPES}
+
+# Subs are listed indented under the player they replaced
+SUB_INDENT = re.compile(r'^\s*(&nbsp;|\s)+')
+
+# Version of the match report records stored as artifacts, bump it when an extractor changes to drop the stored ones
+RECORDS_VERSION = 2
+
+# Cells of the keeper stats tables read into the shots on goal
+KEEPER_CELLS = ['gk_shots_on_target_against']
+
+def player_stats_columns(table):
+	# Columns of a player stats table read with lxml. Subs are told apart by the indentation of the player cell
+	rows = table.xpath('./tbody/tr')
+	columns = table_columns(table, ['player'] + PLAYER_CELLS[1:], rows = './tbody/tr')
+	columns['name'] = columns.pop('player')
+	columns['sub'] = [any(SUB_INDENT.match(th.text_content()) for th in tr.xpath('./th[1]')) for tr in rows]
+	return columns
+
+def player_stats_columns_bs4(div):
+	# Same columns as player_stats_columns read from the bs4 tags
+	columns = {field: [] for field in PLAYER_CELLS + ['sub']}
+	for tr in div.find('tbody').find_all('tr'):
+		for field in PLAYER_CELLS:
+			cell = tr.find('a') if field == 'name' else tr.find('td', attrs = {'data-stat': field})
+			columns[field].append(cell.text if cell is not None else None)
+		th = tr.find('th')
+		columns['sub'].append(th is not None and SUB_INDENT.match(th.text) is not None)
+	return columns
+
+def keeper_stats_columns_bs4(div):
+	return {stat: [cell.text for cell in div.find_all('td', attrs = {'data-stat': stat})] for stat in KEEPER_CELLS}
+
+class MatchReportSections:
+	# Sections of a match report, located in a single walk over the document so every stat
+	# searches its own small subtree instead of the whole page.
+	# Given the lxml tree of the page, the player and keeper stats tables are read from it with table_columns
+	def __init__(self, soup, root = None):
+		self.datapoints = []		# Managers and captains
+		self.scorebox_meta = None
+		self.team_stats = {}		# Label rows of the team stats table: 'Possession', 'Cards'...
+		self.team_stats_extra = {}	# Label divs of the extra team stats: 'Fouls', 'Offsides'...
+		self.lineups = {}			# Lineup divs by id, 'a' for home and 'b' for away
+		self.player_stats = []		# Columns of the player stats tables, home first
+		self.keeper_stats = []		# Columns of the keeper stats tables, home first
+
+		# The first match wins, like soup.find
+		for tag in soup.find_all(['div', 'tr']):
+			if tag.name == 'tr':
+				if tag.string is not None:
+					self.team_stats.setdefault(tag.string, tag)
+				continue
+
+			classes = tag.get('class') or []
+			tag_id = tag.get('id') or ''
+			if 'datapoint' in classes:
+				self.datapoints.append(tag)
+			if 'scorebox_meta' in classes and self.scorebox_meta is None:
+				self.scorebox_meta = tag
+			if 'lineup' in classes and tag_id:
+				self.lineups.setdefault(tag_id, tag)
+			if 'all_player_stats_' in tag_id and root is None:
+				self.player_stats.append(player_stats_columns_bs4(tag))
+			if 'all_keeper_stats_' in tag_id and root is None:
+				self.keeper_stats.append(keeper_stats_columns_bs4(tag))
+			if tag.string is not None:
+				self.team_stats_extra.setdefault(tag.string, tag)
+
+		if root is not None:
+			for div in root.xpath('//div[contains(@id, "all_player_stats_")]'):
+				self.player_stats += [player_stats_columns(table) for table in div.xpath('(.//table)[1]')]
+			for div in root.xpath('//div[contains(@id, "all_keeper_stats_")]'):
+				self.keeper_stats += [table_columns(table, KEEPER_CELLS, rows = './/tbody/tr') for table in div.xpath('.//table')]
+
+def lineup_players(side, lineup, players_stats, timings=None):
+	# Starting and bench players of one side, read from its player stats table
+	timings = timings if timings is not None else SectionTimings()
+	players = []
+	slots = {'starting': 0, 'bench': 0}
+
+	def add_player(role, i):
+		slots[role] += 1
+		row = {'side': side, 'role': role, 'slot': slots[role]}
+		for field in PLAYER_CELLS:
+			if players_stats[field][i] is None:
+				timings.error('player_' + field, KeyError(field))
+			else:
+				row[field] = players_stats[field][i]
+		players.append(row)
+
+	if players_stats is None:
+		timings.error('player_stats', ValueError(f'No player stats table for the {side} side'))
+		return players
+	rows = range(len(players_stats['name']))[::-1]
+
+	try:
+		names = [player.text for player in lineup.find_all('a')]
+		starting, bench = names[:11], names[11:]
+		for i in rows:
+			if players_stats['name'][i] in starting:
+				add_player('starting', i)
+			elif players_stats['name'][i] in bench:
+				add_player('bench', i)
+	except:
+		# Without a lineup, bench players are told apart by their indentation
+		for i in rows:
+			add_player('bench' if players_stats['sub'][i] else 'starting', i)
+	return players
+
+# Match report stats. Every extractor locates its section among the MatchReportSections, parses it into
+# the record and declares the columns it fills with their dtypes. Errors are counted by extractor name
+class StatExtractor:
+	def __init__(self, name, locate, parse, dtypes, needs = ()):
+		self.name = name
+		self.locate = locate		# MatchReportSections -> the section the parser reads
+		self.parse = parse			# parse(section, record, timings) writes the stat columns into record
+		self.dtypes = dtypes		# Columns filled, in output order, and their dtypes
+		self.needs = needs			# Extractors whose columns the parser reads from record
+
+def parse_managers_captains(datapoints, record, timings):
+	record['manager_home'] = datapoints[0].text.replace("Manager: ", "")
+	record['captain_home'] = datapoints[1].text.replace("Captain: ", "")
+	record['manager_away'] = datapoints[2].text.replace("Manager: ", "")
+	record['captain_away'] = datapoints[3].text.replace("Captain: ", "")
+
+def parse_venue_city(scorebox_meta, record, timings):
+	venue_city = scorebox_meta.find_all('strong')[-2].find_next_sibling('small').text
+	record['venue_city'] = venue_city.split(', ')[1]
+
+def parse_possession(label, record, timings):
+	possession = label.find_next_sibling('tr').find_all('strong')
+	record['possessiontime_home'] = float(possession[0].text.strip('%')) / 100 if possession[0].text != '' else 0 
+	record['possessiontime_away'] = float(possession[1].text.strip('%')) / 100 if possession[1].text != '' else 0  
+
+def parse_shots_total(label, record, timings):
+	shots_total = label.find_next_sibling('tr').find_all('td')
+
+	shots_total_home = shots_total[0].find('div').find('div').text
+	shots_total_away = shots_total[1].find('div').find('div').text
+
+	record['shots_total_home'] = int(shots_total_home.split()[2]) if shots_total_home.split()[2] != '' else 0
+	record['shots_total_away'] = int(shots_total_away.split()[-1]) if shots_total_away.split()[-1] != '' else 0
+
+def parse_shots_ongoal(keeper_stats, record, timings):
+	# Shots on goal of a side are the shots on target against the other side's keepers
+	shots_ongoal_against_home = keeper_stats[0]['gk_shots_on_target_against']
+	shots_ongoal_against_away = keeper_stats[1]['gk_shots_on_target_against']
+
+	shots_ongoal_away = sum(int(shot) if shot else 0 for shot in shots_ongoal_against_home)
+	shots_ongoal_home = sum(int(shot) if shot else 0 for shot in shots_ongoal_against_away)
+
+	record['shots_ongoal_home'] = shots_ongoal_home
+	record['shots_ongoal_away'] = shots_ongoal_away
+
+	record['shots_offgoal_home'] = record['shots_total_home'] - record['shots_ongoal_home']
+	record['shots_offgoal_away'] = record['shots_total_away'] - record['shots_ongoal_away']
+
+def parse_saves(label, record, timings):
+	saves = label.find_next_sibling('tr').find_all('td')
+
+	saves_home = saves[0].find('div').find('div').text
+	saves_away = saves[1].find('div').find('div').text
+
+	record['saves_home'] = saves_home.split()[0]
+	record['saves_away'] = saves_away.split()[-3]
+
+def parse_cards(label, record, timings):
+	cards = label.find_next_sibling('tr').find_all('td')
+	for side, cell in [('home', cards[0]), ('away', cards[1])]:
+		side_cards = cell.find('div', class_ = 'cards')
+		record['yellow_cards_' + side] = len(side_cards.find_all('span', class_ = 'yellow_card'))
+		record['red_cards_' + side] = len(side_cards.find_all('span', class_ = 'red_card'))
+		record['yellowred_cards_' + side] = len(side_cards.find_all('span', class_ = 'yellow_red_card'))
+
+def parse_extra_stat(stat):
+	# Fouls, offsides... are a label div between the home and away values
+	def parse(label, record, timings):
+		record[stat + '_home'] = label.find_previous_sibling('div').text
+		record[stat + '_away'] = label.find_next_sibling('div').text
+	return parse
+
+def parse_formation(lineups, record, timings):
+	formation_home = lineups['a'].find('tr').text
+	formation_away = lineups['b'].find('tr').text
+
+	record['formation_home'] = formation_home.split(" ")[-1].split("(")[1].split(")")[0]
+	record['formation_away'] = formation_away.split(" ")[-1].split("(")[1].split(")")[0]
+
+def parse_lineups(sections, record, timings):
+	# Home players come from the first player stats table and away players from the second
+	record['players'] = []
+	for side, lineup_id, table_num in [('home', 'a', 0), ('away', 'b', 1)]:
+		players_stats = sections.player_stats[table_num] if len(sections.player_stats) > table_num else None
+		record['players'] += lineup_players(side, sections.lineups.get(lineup_id), players_stats, timings)
+
+EXTRACTORS = [
+	StatExtractor('managers_captains', lambda sections: sections.datapoints, parse_managers_captains,
+		{'manager_home': 'category', 'captain_home': 'category', 'manager_away': 'category', 'captain_away': 'category'}),
+	StatExtractor('venue_city', lambda sections: sections.scorebox_meta, parse_venue_city, {'venue_city': 'category'}),
+	StatExtractor('possession', lambda sections: sections.team_stats['Possession'], parse_possession,
+		{'possessiontime_home': 'float32', 'possessiontime_away': 'float32'}),
+	StatExtractor('shots_total', lambda sections: sections.team_stats['Shots on Target'], parse_shots_total,
+		{'shots_total_home': 'Int16', 'shots_total_away': 'Int16'}),
+	StatExtractor('shots_ongoal', lambda sections: sections.keeper_stats, parse_shots_ongoal,
+		{'shots_ongoal_home': 'Int16', 'shots_ongoal_away': 'Int16', 'shots_offgoal_home': 'Int16', 'shots_offgoal_away': 'Int16'},
+		needs = ('shots_total',)),
+	StatExtractor('saves', lambda sections: sections.team_stats['Saves'], parse_saves, {'saves_home': 'Int16', 'saves_away': 'Int16'}),
+	StatExtractor('cards', lambda sections: sections.team_stats['Cards'], parse_cards,
+		{col: 'Int8' for col in ['yellow_cards_home', 'red_cards_home', 'yellowred_cards_home', 'yellow_cards_away', 'red_cards_away', 'yellowred_cards_away']}),
+	StatExtractor('fouls', lambda sections: sections.team_stats_extra['Fouls'], parse_extra_stat('fouls'), {'fouls_home': 'Int16', 'fouls_away': 'Int16'}),
+	StatExtractor('offsides', lambda sections: sections.team_stats_extra['Offsides'], parse_extra_stat('offsides'),
+		{'offsides_home': 'Int16', 'offsides_away': 'Int16'}),
+	StatExtractor('formation', lambda sections: sections.lineups, parse_formation, {'formation_home': 'category', 'formation_away': 'category'}),
+	# Lineups fill match_players (or the wide starting_name_home1 like columns) instead of stat columns
+	StatExtractor('lineups', lambda sections: sections, parse_lineups, {}),
+]
+EXTRACTOR_NAMES = [extractor.name for extractor in EXTRACTORS]
+
+def select_extractors(stats = None):
+	# Extractors of the stats asked for (all of them by default) and the ones they need, in registry order
+	if stats is None:
+		return EXTRACTORS
+	unknown = set(stats) - set(EXTRACTOR_NAMES)
+	if unknown:
+		raise ValueError(f'Unknown stats {sorted(unknown)}, available stats are {EXTRACTOR_NAMES}')
+	names = set(stats)
+	for extractor in reversed(EXTRACTORS):
+		if extractor.name in names:
+			names.update(extractor.needs)
+	return [extractor for extractor in EXTRACTORS if extractor.name in names]
+
+def select_record(record, extractors):
+	# Part of a record with the stats of the given extractors
+	columns = [col for extractor in extractors for col in extractor.dtypes]
+	selected = {col: record[col] for col in columns if col in record}
+	if 'players' in record and any(extractor.name == 'lineups' for extractor in extractors):
+		selected['players'] = record['players']
+	selected['extracted'] = [extractor.name for extractor in extractors]
+	return selected
+
+def record_to_arrow(record):
+	# A record as Arrow tables: its stats as a one row table, its players and the extractors that ran
+	tables = {'stats': pa.table({col: [value] for col, value in record.items() if col not in ('players', 'extracted')}),
+		'extracted': pa.table({'name': pa.array(record['extracted'], pa.string())})}
+	if 'players' in record:
+		tables['players'] = pa.table({col: [player.get(col) for player in record['players']] for col in ['side', 'role', 'slot'] + PLAYER_CELLS})
+	return tables
+
+def record_from_arrow(tables):
+	stats = tables['stats'].to_pylist()
+	record = dict(stats[0]) if stats else {}
+	if 'players' in tables:
+		record['players'] = [{col: value for col, value in player.items() if value is not None} for player in tables['players'].to_pylist()]
+	record['extracted'] = tables['extracted'].column('name').to_pylist()
+	return record
+
+def extract_stats(sections, extractors, timings):
+	# Runs every extractor on the sections found in the single walk over the report
+	record = {}
+	lap = timings.laps()
+	for extractor in extractors:
+		try:
+			extractor.parse(extractor.locate(sections), record, timings)
+		except Exception as exc:
+			timings.error(extractor.name, exc)
+		lap(extractor.name)
+	record['extracted'] = [extractor.name for extractor in extractors]
+	return record
+
+# Scores look like 2–1, or (4) 0–0 (3) when the match was decided on penalties
+SCORE = re.compile(r'(?:\((?P<HomePenalties>\d+)\)\s*)?(?P<HomeGoals>\d+)–(?P<AwayGoals>\d+)(?:\s*\((?P<AwayPenalties>\d+)\))?')
+
+# Dtypes of the games and their stats
+GAMES_SCHEMA = {'Round': 'category', 'Wk': 'Int8', 'Day': 'category', 'Date': 'datetime64[ns]',
+	'Home': 'category', 'xG': 'float32', 'xG.1': 'float32', 'Away': 'category', 'Attendance': 'Int32',
+	'Venue': 'category', 'Referee': 'category', 'season': 'Int16', 'league': 'category',
+	'HomeGoals': 'Int8', 'AwayGoals': 'Int8', 'HomePenalties': 'Int8', 'AwayPenalties': 'Int8', 'match_id': 'string',
+	**{col: dtype for extractor in EXTRACTORS for col, dtype in extractor.dtypes.items()},
+	**{col: LINEUP_DTYPES[LINEUP_COLUMN.match(col).group(2)] for col in LINEUP_COLUMNS}}
+
+def match_played(score):
+	# Played matches have a score, shootouts included, and a report. Fixtures still to be played have neither
+	return isinstance(score, str) and SCORE.search(score) is not None
+
+def comp_schedule_url(league, season):
+	league_id = competitions[league]
+	return "https://fbref.com/en/comps/" + str(league_id) + "/" + str(season) + "/schedule/" + str(season) + "-" + league.replace(' ','-') + "-Scores-and-Fixtures"
+
+def match_id(url):
+	# fbref id of a match, taken from its report url
+	found = re.search(r'/matches/([^/]+)/', str(url))
+	return found.group(1) if found else None
+
+def players_from_record(record):
+	# Lineups of checkpoint entries written before the long format, stored as starting_age_home7 like columns
+	players = {}
+	for col, value in record.items():
+		found = LINEUP_COLUMN.match(col)
+		if found:
+			role, field, side, slot = found.groups()
+			players.setdefault((side, role, int(slot)), {'side': side, 'role': role, 'slot': int(slot)})[field] = value
+	return list(players.values())
+
+def match_players_frame(players):
+	# One row per player and match, with compact dtypes
+	return apply_schema(split_age(pd.DataFrame.from_records(players, columns = MATCH_PLAYERS_COLUMNS)), MATCH_PLAYERS_SCHEMA)
+
+def wide_lineups(match_players):
+	# Pivots match_players back to one row per match with the starting_name_home1 like columns
+	if match_players.empty:
+		return pd.DataFrame(columns = LINEUP_COLUMNS)
+	df = match_players.astype({col: object for col in ['side', 'role', 'name', 'position']})
+	wide = df.set_index(['match_id', 'role', 'side', 'slot'])[LINEUP_FIELDS].unstack(['role', 'side', 'slot'])
+	wide.columns = [role + '_' + field + '_' + side + str(slot) for field, role, side, slot in wide.columns]
+	return wide.reindex(columns = [col for col in LINEUP_COLUMNS if col in wide.columns])
+
+def games_with_stats(games, records, extractors, lineups = 'wide'):
+	# The games with the stats of their match report records (in the same order) as columns,
+	# and the players of their lineups in long format, one row per player and match
+	extracted = [extractor.name for extractor in extractors]
+	matches = [match_id(url) for url in games['Match Report']]
+	players = {}
+	for match, record in zip(matches, records):
+		if match is not None and match not in players and 'lineups' in extracted:
+			players[match] = [dict(player, match_id = match) for player in (record['players'] if 'players' in record else players_from_record(record))]
+	match_players = match_players_frame([player for side_players in players.values() for player in side_players])
+
+	# Build all stats columns at once; the wide view adds the lineup slots any match used
+	columns = [col for extractor in extractors for col in extractor.dtypes]
+	stats = pd.DataFrame.from_records(records, columns = columns, index = games.index)
+	if lineups == 'wide':
+		wide = wide_lineups(match_players).reindex(matches).dropna(axis = 1, how = 'all')
+		wide.index = games.index
+		stats = pd.concat([stats, wide], axis = 1)
+	else:
+		stats.insert(0, 'match_id', matches)
+	stats = apply_schema(stats, GAMES_SCHEMA)
+	return pd.concat([games.drop(columns = stats.columns, errors = 'ignore'), stats], axis = 1), match_players
+
 class FBREFScraper:
-	def __init__(self, seasons, leagues):
+	def __init__(self, seasons, leagues, cache = None, fetcher = None, backend = 'lxml', checkpoint = None, parse_workers = 0, lineups = 'wide', stats = None, artifacts = None, planner = None):
 		self.seasons = seasons
 		self.leagues = leagues
+		self.backend = backend
+		self.checkpoint = checkpoint
+		self.artifacts = artifacts
+		# Schedules whose games were all played are read from the cache instead of requested again
+		self.planner = planner
+		self.lineups = lineups
+		# Names of the extractors to run on every match report, None runs all of them
+		self.stats = stats
+		self.extractors = select_extractors(stats)
+		self.timings = SectionTimings()
+		self.fetcher = fetcher if fetcher else Fetcher(cache = cache)
+		self.parse_pool = ParsePool(workers = parse_workers, timings = self.timings)
 
 		self.competitions = {'season': self.seasons, 'league': self.leagues}
 		self.competitions_df = pd.DataFrame(list(itertools.product(*self.competitions.values())), columns = self.competitions.keys())
   
 		self.games = pd.DataFrame()
+		self.match_players = match_players_frame([])
 		
 	def get_comp_games(self, league, season):
-		league_id = competitions[league]
-		url = "https://fbref.com/en/comps/" + str(league_id) + "/" + str(season) + "/schedule/" + str(season) + "-" + league.replace(' ','-') + "-Scores-and-Fixtures"
+		url = comp_schedule_url(league, season)
 		
 		# Get competition page
-		req = requests.get(url)
+		lap = self.timings.laps()
+		req = self.fetcher.get(url, stale_ok = self.planner is not None and self.planner.settled(url))
+		lap('fetch')
 		if req.status_code==200:
+			content = uncomment_tables(req.content)
       		# Get table of contents
-			soup = BeautifulSoup(req.content, features="html.parser")
-			table = soup.find_all('table')[0]
-
-			df = pd.read_html(StringIO(str(table)))[0]
+			if self.backend == 'lxml':
+				table = parse_html(content).xpath('//table')[0]
+				df = read_table(table)
+			else:
+				soup = BeautifulSoup(content, features="html.parser")
+				table = soup.find_all('table')[0]
+				df = pd.read_html(StringIO(str(table)))[0]
 			df['season'] = season
 			df['league'] = league
 
 			df = df[(df['Home'].notna()) & (df['Home'] != 'Home')].reset_index(drop=True)
 
 			# Get games' url
-			table_rows = table.find('tbody').findAll("tr", class_ = False) 
 			games_url = []
-			for game in table_rows:
-				game_url = game.find('td', attrs = {'data-stat':'match_report'}).find('a')['href']
-				games_url.append('https://fbref.com/' + game_url)
+			if self.backend == 'lxml':
+				for game in table.xpath('./tbody//tr[not(@class)]'):
+					game_url = game.xpath('./td[@data-stat="match_report"]//a/@href')[0]
+					games_url.append('https://fbref.com/' + game_url)
+			else:
+				table_rows = table.find('tbody').findAll("tr", class_ = False) 
+				for game in table_rows:
+					game_url = game.find('td', attrs = {'data-stat':'match_report'}).find('a')['href']
+					games_url.append('https://fbref.com/' + game_url)
 
 			df['Match Report'] = games_url
 
-			df['HomeGoals'] = df['Score'].apply(lambda x: x.split('–')[0] if '–' in x else None)
-			df['AwayGoals'] = df['Score'].apply(lambda x: x.split('–')[1] if '–' in x else None)
+			# Fixtures not played yet have no score, shootouts keep their penalties apart from the goals
+			score = df['Score'].astype('string').str.extract(SCORE)
+			for col in ['HomeGoals', 'AwayGoals', 'HomePenalties', 'AwayPenalties']:
+				df[col] = score[col]
+			if self.planner is not None:
+				self.planner.record(url, df['Date'], df['Score'].map(match_played))
+			lap('schedule')
    
-			return df
+			return apply_schema(df, GAMES_SCHEMA)
 		else:
 			print(f'--- Request {url} failed with status: {req.status_code} ---')  
 	
 	def get_games(self):
-		for index, row in tqdm(self.competitions_df.iterrows(), desc = 'Getting games'):
+		def comp_games(row):
 			try:
-				df = self.get_comp_games(league= row['league'], season = row['season'])
-				self.games = pd.concat([self.games, df], axis = 0)
+				return self.get_comp_games(league= row['league'], season = row['season'])
 			except:
-				print(f'--- Error while scraping {row['league']} - {row['season']} games ---')
-   
-			# Sleeps for 3 seconds according to FBREF Terms & Conditions.
-			sleep(3 + random())
-
-	def get_stats(self, index, row):
+				print(f"--- Error while scraping {row['league']} - {row['season']} games ---")
+
+		# Requests are spaced according to FBREF Terms & Conditions by the fetcher
+		comps = [row for index, row in self.competitions_df.iterrows()]
+		comps_games = list(tqdm(self.fetcher.map(comp_games, comps), total = len(comps), desc = 'Getting games'))
+		if self.planner is not None:
+			self.planner.save()
+		# Categories of every competition are merged again after the concat
+		self.games = apply_schema(pd.concat([self.games] + comps_games, axis = 0, ignore_index = True), GAMES_SCHEMA)
+
+	def get_stats(self, row):
+		# Fetches and parses a single match report; get_games_stats builds the columns once per batch
 		url = row['Match Report']
-		req = requests.get(url)
+		lap = self.timings.laps()
+		req = self.fetcher.get(url)
+		lap('fetch')
 		if req.status_code==200:
-			req = requests.get(url)
-			soup = BeautifulSoup(req.content, features="html.parser")
-
-			# Coach and captain
-			try:
-				managers_captains = soup.find_all('div', class_ = 'datapoint')
-    
-				self.games.loc[index, 'manager_home'] = managers_captains[0].text.replace("Manager: ", "")
-				self.games.loc[index, 'captain_home'] = managers_captains[1].text.replace("Captain: ", "")
-				self.games.loc[index, 'manager_away'] = managers_captains[2].text.replace("Manager: ", "")
-				self.games.loc[index, 'captain_away'] = managers_captains[3].text.replace("Captain: ", "")
-			
-			except:
-				print("-- Error while getting Coachs or Captains --")
-
-			# Venue city
-			try:
-				venue_city = soup.find('div', class_ = 'scorebox_meta').find_all('strong')[-2].find_next_sibling('small').text
-				
-				self.games.loc[index, 'venue_city'] = venue_city.split(', ')[1]
-
-			except:
-				print( "-- Error while getting Venue City --" )
-
-			# Possession
-			try:
-				possession = soup.find('tr', string = 'Possession').find_next_sibling('tr').find_all('strong')
-				
-				self.games.loc[index, 'possessiontime_home'] = float(possession[0].text.strip('%')) / 100 if possession[0].text != '' else 0 
-				self.games.loc[index, 'possessiontime_away'] = float(possession[1].text.strip('%')) / 100 if possession[1].text != '' else 0  
-			except (AttributeError, IndexError, ValueError, TypeError, KeyError):
-				print( "-- Error while getting Possession --" )
-
-			# Total Shots
-			try:
-				shots_total = soup.find('tr', string = 'Shots on Target').find_next_sibling('tr').find_all('td')
-
-				shots_total_home = shots_total[0].find('div').find('div').text
-				shots_total_away = shots_total[1].find('div').find('div').text
-
-				self.games.loc[index, 'shots_total_home'] = int(shots_total_home.split()[2]) if shots_total_home.split()[2] != '' else 0
-				self.games.loc[index, 'shots_total_away'] = int(shots_total_away.split()[-1]) if shots_total_away.split()[-1] != '' else 0
-
-			except (AttributeError, IndexError, ValueError, TypeError, KeyError):
-				print( "-- Error while getting Total Shots --" )
-
-			# Shots ongoal and offgoal
-			try:
-				shots_ongoal = soup.select('div[id*="all_keeper_stats_"]')
-
-				shots_ongoal_against_home = shots_ongoal[0].find_all('td', attrs = {'data-stat': 'gk_shots_on_target_against'})
-				shots_ongoal_against_away = shots_ongoal[1].find_all('td', attrs = {'data-stat': 'gk_shots_on_target_against'})
-
-				shots_ongoal_away = 0
-				for i in range(0, len(shots_ongoal_against_home)):
-					shot = shots_ongoal_against_home[i].text if shots_ongoal_against_home[i].text != "" else 0
-					shots_ongoal_away += int(shot) 
-
-				shots_ongoal_home = 0
-				for i in range(0, len(shots_ongoal_against_away)):
-					shot = shots_ongoal_against_away[i].text if shots_ongoal_against_away[i].text != "" else 0 
-					shots_ongoal_home += int(shot)
-
-				self.games.loc[index, 'shots_ongoal_home'] = shots_ongoal_home
-				self.games.loc[index, 'shots_ongoal_away'] = shots_ongoal_away
-
-				self.games.loc[index, 'shots_offgoal_home'] = self.games['shots_total_home'][index] - self.games['shots_ongoal_home'][index]
-				self.games.loc[index, 'shots_offgoal_away'] = self.games['shots_total_away'][index] - self.games['shots_ongoal_away'][index]
-
-			except: 
-				print( "-- Error while getting Shots ongoal and offgoal --" )
-
-
-			# Saves
-			try:
-				saves = soup.find('tr', string = 'Saves').find_next_sibling('tr').find_all('td')
-
-				saves_home = saves[0].find('div').find('div').text
-				saves_away = saves[1].find('div').find('div').text
-
-				self.games.loc[index, 'saves_home'] = saves_home.split()[0]
-				self.games.loc[index, 'saves_away'] = saves_away.split()[-3]
-
-			except:
-				print( "-- Error while getting Saves --" )
-
-			# Cards
-			try: 
-				cards = soup.find('tr', string = 'Cards').find_next_sibling('tr').find_all('td')
-
-				yellow_cards_home = cards[0].find('div', class_ = 'cards').find_all('span', class_ = 'yellow_card')
-				red_cards_home = cards[0].find('div', class_ = 'cards').find_all('span', class_ = 'red_card')
-				yellow_red_cards_home = cards[0].find('div', class_ = 'cards').find_all('span', class_ = 'yellow_red_card')
-
-				yellow_cards_away = cards[1].find('div', class_ = 'cards').find_all('span', class_ = 'yellow_card')
-				red_cards_away = cards[1].find('div', class_ = 'cards').find_all('span', class_ = 'red_card')
-				yellow_red_cards_away = cards[1].find('div', class_ = 'cards').find_all('span', class_ = 'yellow_red_card')
-
-				self.games.loc[index, 'yellow_cards_home'] = len(yellow_cards_home)
-				self.games.loc[index, 'red_cards_home'] = len(red_cards_home)
-				self.games.loc[index, 'yellowred_cards_home'] = len(yellow_red_cards_home)
-				self.games.loc[index, 'yellow_cards_away'] = len(yellow_cards_away)
-				self.games.loc[index, 'red_cards_away'] = len(red_cards_away)
-				self.games.loc[index, 'yellowred_cards_away'] = len(yellow_red_cards_away)
-
-			except:
-				print(f"-- Error while getting Cards: {url} -- " )
-
-			# Fouls
-			try:
-				fouls_home = soup.find('div', string = 'Fouls').find_previous_sibling('div').text
-				fouls_away = soup.find('div', string = 'Fouls').find_next_sibling('div').text
-
-				self.games.loc[index, 'fouls_home'] = fouls_home
-				self.games.loc[index, 'fouls_away'] = fouls_away
-
-			except:
-				print( "-- Error while getting Fouls --" )
-
-			# Offsides
-			try:
-				offsides_home = soup.find('div', string = 'Offsides').find_previous_sibling('div').text
-				offsides_away = soup.find('div', string = 'Offsides').find_next_sibling('div').text
-
-				self.games.loc[index, 'offsides_home'] = offsides_home
-				self.games.loc[index, 'offsides_away'] = offsides_away
-
-			except:
-				print( "-- Error while getting Offsides --" )
-
-			# Formation
-			try:
-				formation_home = soup.find('div', class_ = 'lineup', id='a').find('tr').text
-				formation_away = soup.find('div', class_ = 'lineup', id='b').find('tr').text
-
-				self.games.loc[index, 'formation_home'] = formation_home.split(" ")[-1].split("(")[1].split(")")[0]
-				self.games.loc[index, 'formation_away'] = formation_away.split(" ")[-1].split("(")[1].split(")")[0]
-
-			except:
-				print( "-- Error while getting formations --" )
-
-			# Home lineups
-			starting_num = 0
-			bench_num = 0
-			try:
-				lineups_home = soup.find('div', class_ = 'lineup', id='a').find_all('a')
-
-				starting_home = []
-				bench_home = []
-				for i in range(0, len(lineups_home)):
-					if i in range(0, 11):
-						starting_home.append(lineups_home[i].text)
-					else:
-						bench_home.append(lineups_home[i].text)
-
-				try:
-					players_stats_home = soup.select('div[id*="all_player_stats_"]')[0].find('tbody').find_all('tr')[::-1]
-				except:
-					print( "-- Error while getting player stats --" )
-
-				for j in range(0, len(players_stats_home)):
-					if players_stats_home[j].find('a').text in starting_home:
-						try:
-							self.games.loc[index, "starting_name_home" + str(starting_num + 1)] = players_stats_home[j].find('a').text
-						except:
-							print( f"-- Error while getting player home: {starting_num + 1} --" )
-						try:
-							self.games.loc[index, "starting_age_home" + str(starting_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'age'}).text
-						except:
-							print( f"-- Error while getting player home age: {starting_num + 1} --" )
-						try:
-							self.games.loc[index, "starting_position_home" + str(starting_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'position'}).text
-						except:
-							print( f"-- Error while getting player home position: {starting_num + 1} --" )
-						try:
-							self.games.loc[index, "starting_minutes_home" + str(starting_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'minutes'}).text
-						except:
-							print( f"-- Error while getting player home minutes: {starting_num + 1} --" )
-						try:
-							self.games.loc[index, "starting_goals_home" + str(starting_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'goals'}).text
-						except:
-							print( f"-- Error while getting player home goals: {starting_num + 1} --" )
-						starting_num += 1
-					
-					elif players_stats_home[j].find('a').text in bench_home:
-						try:
-							self.games.loc[index, "bench_name_home" + str(bench_num + 1)] = players_stats_home[j].find('a').text
-						except:
-							print( f"-- Error while getting player home: {bench_num+1} --" )
-						try:
-							self.games.loc[index, "bench_age_home" + str(bench_num + 1 )] = players_stats_home[j].find('td', attrs = {'data-stat': 'age'}).text
-						except:
-							print( f"-- Error while getting player home age: {bench_num+1} --" )
-						try:
-							self.games.loc[index, "bench_position_home" + str(bench_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'position'}).text
-						except:
-							print( f"-- Error while getting player home position: {bench_num+1} --" )
-						try:
-							self.games.loc[index, "bench_minutes_home" + str(bench_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'minutes'}).text
-						except:
-							print( f"-- Error while getting player home minutes: {bench_num+1} --" )
-						try:
-							self.games.loc[index, "bench_goals_home" + str(bench_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'goals'}).text
-						except:
-							print( f"-- Error while getting player home goals: {bench_num+1} --" )
-						bench_num += 1
-			except:
-				pattern = re.compile(r'^\s*(&nbsp;|\s)+')
-				try:
-					players_stats_home = soup.select('div[id*="all_player_stats_"]')[0].find('tbody').find_all('tr')[::-1]
-				except:
-					print( "-- Error while getting player stats --" )
-				
-				for j in range(0, len(players_stats_home)):
-					player = players_stats_home[j].find('th').text
-					if pattern.match(player):
-						try:
-							self.games.loc[index, "bench_name_home" + str(bench_num + 1)] = players_stats_home[j].find('a').text
-						except:
-							print( f"-- Error while getting player home: {bench_num + 1} --" )
-						try:
-							self.games.loc[index, "bench_age_home" + str(bench_num + 1 )] = players_stats_home[j].find('td', attrs = {'data-stat': 'age'}).text
-						except:
-							print( f"-- Error while getting player home age: {bench_num + 1} --" )
-						try:
-							self.games.loc[index, "bench_position_home" + str(bench_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'position'}).text
-						except:
-							print( f"-- Error while getting player home position: {bench_num + 1} --" )
-						try:
-							self.games.loc[index, "bench_minutes_home" + str(bench_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'minutes'}).text
-						except:
-							print( f"-- Error while getting player home minutes: {bench_num + 1} --" )
-						try:
-							self.games.loc[index, "bench_goals_home" + str(bench_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'goals'}).text
-						except:
-							print( f"-- Error while getting player home goals: {bench_num + 1} --" )
-						bench_num += 1
-					else:
-						try:
-							self.games.loc[index, "starting_name_home" + str(starting_num + 1)] = players_stats_home[j].find('a').text
-						except:
-							print( f"-- Error while getting player home: {starting_num + 1} --" )
-						try:
-							self.games.loc[index, "starting_age_home" + str(starting_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'age'}).text
-						except:
-							print( f"-- Error while getting player home age: {starting_num + 1} --" )
-						try:
-							self.games.loc[index, "starting_position_home" + str(starting_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'position'}).text
-						except:
-							print( f"-- Error while getting player home position: {starting_num + 1} --" )
-						try:
-							self.games.loc[index, "starting_minutes_home" + str(starting_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'minutes'}).text
-						except:
-							print( f"-- Error while getting player home minutes: {starting_num + 1} --" )
-						try:
-							self.games.loc[index, "starting_goals_home" + str(starting_num + 1)] = players_stats_home[j].find('td', attrs = {'data-stat': 'goals'}).text
-						except:
-							print( f"-- Error while getting player home goals: {starting_num + 1} --" )
-						starting_num += 1
-			
-			# Away lineups
-			starting_num = 0
-			bench_num = 0
-			try:
-				lineups_away = soup.find('div', class_ = 'lineup', id='b').find_all('a')
-
-				starting_away = []
-				bench_away = []
-				for i in range(0, len(lineups_away)):
-					if i in range(0, 11):
-						starting_away.append(lineups_away[i].text)
-					else:
-						bench_away.append(lineups_away[i].text)
-				try:
-					players_stats_away = soup.select('div[id*="all_player_stats_"]')[1].find('tbody').find_all('tr')[::-1]
-				except:
-					print( "-- Error while getting player stats --" )
-
-				for j in range(0, len(players_stats_away)):
-					if players_stats_away[j].find('a').text in starting_away:
-						try:
-							self.games.loc[index, "starting_name_away" + str(starting_num + 1)] = players_stats_away[j].find('a').text
-						except:
-							print( f"-- Error while getting player away: {starting_num + 1}" )
-						try:
-							self.games.loc[index, "starting_age_away" + str(starting_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'age'}).text
-						except:
-							print( f"-- Error while getting player away age: {starting_num + 1}" )
-						try:
-							self.games.loc[index, "starting_position_away" + str(starting_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'position'}).text
-						except:
-							print( f"-- Error while getting player away position: {starting_num + 1}" )
-						try:
-							self.games.loc[index, "starting_minutes_away" + str(starting_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'minutes'}).text
-						except:
-							print( f"-- Error while getting player away minutes: {starting_num + 1}" )
-						try:
-							self.games.loc[index, "starting_goals_away" + str(starting_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'goals'}).text
-						except:
-							print( f"-- Error while getting player away goals: {starting_num + 1}" )
-						starting_num += 1
-
-					elif players_stats_away[j].find('a').text in bench_away:
-						try:
-							self.games.loc[index, "bench_name_away" + str(bench_num + 1)] = players_stats_away[j].find('a').text
-						except:
-							print( f"-- Error while getting player away: {bench_num + 1}" )
-						try:
-							self.games.loc[index, "bench_age_away" + str(bench_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'age'}).text
-						except:
-							print( f"-- Error while getting player away age: {bench_num + 1}" )
-						try:
-							self.games.loc[index, "bench_position_away" + str(bench_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'position'}).text
-						except:
-							print( f"-- Error while getting player away position: {bench_num + 1}" )
-						try:
-							self.games.loc[index, "bench_minutes_away" + str(bench_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'minutes'}).text
-						except:
-							print( f"-- Error while getting player away minutes: {bench_num + 1}" )
-						try:
-							self.games.loc[index, "bench_goals_away" + str(bench_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'goals'}).text
-						except:
-							print( f"-- Error while getting player away goals: {bench_num + 1}" )
-						bench_num += 1
-			except:
-				try:
-					players_stats_away = soup.select('div[id*="all_player_stats_"]')[1].find('tbody').find_all('tr')[::-1]
-				except:
-					print( "-- Error while getting player stats --" )
-
-				for j in range(0, len(players_stats_away)):
-					player = players_stats_away[j].find('th').text
-					if pattern.match(player):
-						try:
-							self.games.loc[index, "bench_name_away" + str(bench_num + 1)] = players_stats_away[j].find('a').text
-						except:
-							print( f"-- Error while getting player away: {bench_num + 1}" )
-						try:
-							self.games.loc[index, "bench_age_away" + str(bench_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'age'}).text
-						except:
-							print( f"-- Error while getting player away age: {bench_num + 1}" )
-						try:
-							self.games.loc[index, "bench_position_away" + str(bench_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'position'}).text
-						except:
-							print( f"-- Error while getting player away position: {bench_num + 1}" )
-						try:
-							self.games.loc[index, "bench_minutes_away" + str(bench_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'minutes'}).text
-						except:
-							print( f"-- Error while getting player away minutes: {bench_num + 1}" )
-						try:
-							self.games.loc[index, "bench_goals_away" + str(bench_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'goals'}).text
-						except:
-							print( f"-- Error while getting player away goals: {bench_num + 1}" )
-						bench_num += 1
-					else:
-						try:
-							self.games.loc[index, "starting_name_away" + str(starting_num + 1)] = players_stats_away[j].find('a').text
-						except:
-							print( f"-- Error while getting player away: {starting_num + 1}" )
-						try:
-							self.games.loc[index, "starting_age_away" + str(starting_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'age'}).text
-						except:
-							print( f"-- Error while getting player away age: {starting_num + 1}" )
-						try:
-							self.games.loc[index, "starting_position_away" + str(starting_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'position'}).text
-						except:
-							print( f"-- Error while getting player away position: {starting_num + 1}" )
-						try:
-							self.games.loc[index, "starting_minutes_away" + str(starting_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'minutes'}).text
-						except:
-							print( f"-- Error while getting player away minutes: {starting_num + 1}" )
-						try:
-							self.games.loc[index, "starting_goals_away" + str(starting_num + 1)] = players_stats_away[j].find('td', attrs = {'data-stat': 'goals'}).text
-						except:
-							print( f"-- Error while getting player away goals: {starting_num + 1}" )
-						starting_num += 1
+			return FBREFScraper.parse_stats(req.content, url, self.backend, self.stats, self.artifacts, self.timings)
+		return {}
+
+	@staticmethod
+	def parse_stats(content, url, backend = 'lxml', stats = None, artifacts = None, timings = None):
+		# Returns a flat record with the match stats, only of the extractors named in stats if given.
+		# Static so parse worker processes can run it without the scraper
+		timings = timings if timings is not None else SectionTimings()
+		lap = timings.laps()
+
+		# With artifacts, reports parsed before are read from their stored record without parsing the page.
+		# A report is parsed once for every stat, so later runs asking for other stats read the record too
+		extractors = select_extractors(stats)
+		if artifacts is not None:
+			stored = artifacts.load('match_report', RECORDS_VERSION, url, content)
+			timings.count('artifacts', status = 'miss' if stored is None else 'hit', kind = 'match_report')
+			if stored is not None:
+				record = select_record(record_from_arrow(stored), extractors)
+				lap('artifacts')
+				return record
+
+		# Keeper and extra stats tables are often commented out, they are lifted into the page first.
+		# bs4 on top of the lxml tree builder is several times faster than html.parser. With lxml the player
+		# and keeper stats tables, the bulk of the page, are read from the lxml tree instead of bs4 tags
+		page = uncomment_tables(content)
+		soup = BeautifulSoup(page, features = "lxml" if backend == 'lxml' else "html.parser")
+		root = parse_html(page) if backend == 'lxml' else None
+		lap('parse')
+		sections = MatchReportSections(soup, root)
+		lap('sections')
+		if artifacts is None:
+			return extract_stats(sections, extractors, timings)
+
+		record = extract_stats(sections, EXTRACTORS, timings)
+		artifacts.store('match_report', RECORDS_VERSION, url, content, record_to_arrow(record))
+		lap('artifacts')
+		return select_record(record, extractors)
  
-	def get_games_stats(self):
-		for index, row in tqdm(self.games.iterrows(), desc = 'Scraping games stats'):
-			self.get_stats(index =index, row=row)
-
-			# Sleeps for 3 seconds according to FBREF Terms & Conditions.
-			sleep(3 + random())
+	def get_games_stats(self, since = None):
+		records = [record for row, record in self.iter_match_stats(since)]
+		self.add_stats(records)
+
+	def iter_match_stats(self, since = None):
+		# Yields (game row, stats record) of every match of self.games as soon as its report is parsed.
+		# Matches finished in previous runs are read from the checkpoint instead of requested again
+		# Matches stored by a run with fewer stats are scraped again, entries from before the stats selection have them all
+		extracted = set(extractor.name for extractor in self.extractors)
+		done = self.checkpoint.load(lambda entry: extracted <= set(entry['rows'][0].get('extracted', EXTRACTOR_NAMES))) if self.checkpoint is not None else {}
+		if since is not None:
+			self.games = self.games[(pd.to_datetime(self.games['Date']) >= since) | self.games['Match Report'].isin(done)].reset_index(drop = True)
+
+		def fetch_report(row):
+			url = row['Match Report']
+			# Only played matches have a report, the others are requested once they are played
+			if url in done or not match_played(row['Score']):
+				return row, None, ()
+			lap = self.timings.laps()
+			try:
+				req = self.fetcher.get(url)
+			except OfflineCacheMiss:
+				print(f"--- {url} is not cached, skipping ---")
+				return row, None, ()
+			lap('fetch')
+			if req.status_code != 200:
+				return row, None, ()
+			return row, req.content, (url, self.backend, self.stats, self.artifacts)
+
+		# Requests are spaced according to FBREF Terms & Conditions by the fetcher,
+		# the downloaded reports are parsed by the parse pool while the next ones are requested
+		pages = self.fetcher.map(fetch_report, [row for index, row in self.games.iterrows()])
+		for row, record in tqdm(self.parse_pool.map(FBREFScraper.parse_stats, pages), total = len(self.games), desc = 'Scraping games stats'):
+			if row['Match Report'] in done:
+				record = done.rows(row['Match Report'])[0]
+			elif record is None:
+				record = {}
+			elif record and self.checkpoint is not None:
+				self.checkpoint.append(row['Match Report'], [record], date = row['Date'])
+			yield row, record
+
+	def add_stats(self, records):
+		# Adds the stats of the match report records, in the order of self.games, as columns
+		lap = self.timings.laps()
+		self.games, self.match_players = games_with_stats(self.games, records, self.extractors, self.lineups)
+		lap('frames')
+
+	def iter_games(self, since = None):
+		# Yields (game, players) of every match as soon as its report is parsed: a one row frame of the game with
+		# its stats, typed like run's games, and its players in long format. Reports are requested as the matches
+		# are consumed, only a few ahead, so memory stays bounded however many seasons are scraped
+		self.get_games()
+		for row, record in self.iter_match_stats(since):
+			yield games_with_stats(self.games.loc[[row.name]], [record], self.extractors, self.lineups)
 
-	def run(self):
+	def run(self, since = None):
 		# Get games
 		self.get_games()
 
 		# Get games stats
-		self.get_games_stats()
+		self.get_games_stats(since)
 
 def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--cache-dir', default = '.page_cache')
+	parser.add_argument('--offline', action = 'store_true', help = 'Replay pages from the cache only')
+	parser.add_argument('--backend', choices = BACKENDS, default = 'lxml', help = 'HTML parser used to read the pages')
+	parser.add_argument('--artifact-dir', default = '.artifact_cache', help = 'Sections read from every match report, extracting new stats reads them instead of the pages')
+	parser.add_argument('--checkpoint', default = 'games_checkpoint.jsonl', help = 'Append-only store of finished matches, used to resume runs')
+	parser.add_argument('--since', help = "Only scrape matches played from this date on, or 'last' for the newest stored match")
+	parser.add_argument('--ledger', default = 'requests_ledger.csv', help = 'Where to save the report of requested pages (.csv or .parquet)')
+	parser.add_argument('--lineups', choices = ['wide', 'long'], default = 'wide', help = 'Lineups as starting_name_home1 like columns of games.csv, or one row per player in match_players.csv')
+	parser.add_argument('--parse-workers', type = int, default = os.cpu_count(), help = 'Processes that parse the match reports, 0 parses them in the main process')
+	parser.add_argument('--stats', nargs = '+', choices = EXTRACTOR_NAMES, help = 'Only extract these stats from the match reports, e.g. possession without lineups')
+	parser.add_argument('--refresh-plan', default = 'refresh_plan.json', help = 'State of every schedule page, the ones whose games were all played are not requested again')
+	parser.add_argument('--db', help = 'SQLite database the games (and long lineups) are upserted into, only changed rows are written')
+	parser.add_argument('--metrics', default = 'metrics.jsonl', help = 'Where to export timings, counters and queue depths (.prom for the Prometheus text format)')
+	args = parser.parse_args()
+
 	Scraper = FBREFScraper(
 		seasons = [2022, 2023],
-		leagues = ['Copa Libertadores', 'Copa Sudamericana', 'Primera Division', 'Copa de la Liga Profesional']
+		leagues = ['Copa Libertadores', 'Copa Sudamericana', 'Primera Division', 'Copa de la Liga Profesional'],
+		cache = PageCache(path = args.cache_dir, offline = args.offline),
+		backend = args.backend,
+		checkpoint = CheckpointStore(args.checkpoint),
+		parse_workers = args.parse_workers,
+		lineups = args.lineups,
+		stats = args.stats,
+		artifacts = ArtifactCache(args.artifact_dir),
+		planner = RefreshPlanner(args.refresh_plan)
 	)
 	
 	# Get games
-	Scraper.run()
+	Scraper.run(since = since_date(args.since, Scraper.checkpoint))
  
-	# Save games df to csv
+	# Save games df to csv, and to parquet with its dtypes
+	lap = Scraper.timings.laps()
 	Scraper.games.to_csv('games.csv', encoding='utf-8-sig', index = False)
+	write_parquet(Scraper.games, 'games.parquet')
+	if args.lineups == 'long':
+		Scraper.match_players.to_csv('match_players.csv', encoding='utf-8-sig', index = False)
+		write_parquet(Scraper.match_players, 'match_players.parquet')
+	if args.db:
+		store = SqliteStore(args.db)
+		written = store.upsert('fbref_games', Scraper.games)
+		if args.lineups == 'long':
+			written += store.upsert('fbref_match_players', Scraper.match_players)
+		store.close()
+		print(f'{written} rows written to {args.db}')
+	lap('write')
+
+	# Save report of requested pages
+	LEDGER.save(args.ledger)
+	if LEDGER.duplicates():
+		print(f'--- {len(LEDGER.duplicates())} pages were requested more than once, see {args.ledger} ---')
+
+	# Save timings, extractor errors and request counters
+	export_metrics(args.metrics, Scraper.timings, METRICS)
+	if Scraper.timings.errors():
+		print(f'--- {Scraper.timings.errors()} stats could not be extracted, see {args.metrics} ---')
  
  
 if __name__ == "__main__":
@@ -1,4 +1,7 @@
+import numpy as np
+import pandas as pd
 from datetime import datetime
+from dateutil.tz import tzlocal
 
 def convert_time_format(time_str):
     # Determine if it's AM or PM
@@ -22,4 +25,47 @@ def assign_teams(row):
 
     row['pts_team'] = row['home_pts'] if row['is_home'] == 1 else row['away_pts']
     row['pts_rival'] = row['away_pts'] if row['is_home'] == 1 else row['home_pts']
-    return row
\ No newline at end of file
+    return row
+
+def convert_time_format_vectorized(times):
+    # Same as convert_time_format for a whole column ('7:30p' -> '19:30:00').
+    # Start times repeat a lot, so every distinct value is converted once
+    unique = pd.Series(pd.unique(times))
+    am_pm_indicator = unique.str.strip().str[-1].str.lower().map({'p': 'PM', 'a': 'AM'})
+    clock = unique.str.strip().str.rstrip('apAP').str.split(':', n=1, expand=True)
+
+    hours = clock[0].astype(int)
+    hours = hours.where(am_pm_indicator.isna(), hours % 12 + np.where(am_pm_indicator == 'PM', 12, 0))
+
+    converted = hours.astype(str).str.zfill(2) + ':' + clock[1].str.zfill(2) + ':00'
+    return times.map(pd.Series(converted.values, index=unique.values))
+
+def parse_repeated_dates(values, format):
+    # Schedules repeat the same few hundred dates, so every distinct value is parsed once
+    unique = pd.unique(values)
+    return values.map(pd.Series(pd.to_datetime(unique, format=format), index=unique))
+
+def add_game_datetimes(games):
+    # Parses the schedule's date and start time columns with explicit formats
+    games = games.copy()
+    games['start_time'] = convert_time_format_vectorized(games['start_time'])
+    games['datetime'] = games['date'] + ' ' +  games['start_time']
+
+    games['date'] = parse_repeated_dates(games['date'], format="%a, %b %d, %Y")
+    games['datetime'] = parse_repeated_dates(games['datetime'], format="%a, %b %d, %Y %H:%M:%S")
+
+    # Timestamps of the local datetimes, as datetime.timestamp() does
+    games['timestamp'] = (games['datetime'].dt.tz_localize(tzlocal()) - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+    return games
+
+def assign_teams_vectorized(players):
+    # Same as players.apply(assign_teams, axis=1) using column selection
+    is_home = players['is_home'] == 1
+    players = players.copy()
+
+    players['team'] = np.where(is_home, players['home'], players['away'])
+    players['rival'] = np.where(is_home, players['away'], players['home'])
+
+    players['pts_team'] = np.where(is_home, players['home_pts'], players['away_pts'])
+    players['pts_rival'] = np.where(is_home, players['away_pts'], players['home_pts'])
+    return players
@@ -0,0 +1,204 @@
+import pandas as pd
+import argparse
+import os
+import sys
+from bs4 import BeautifulSoup
+from tqdm import tqdm
+from players_scraper import PLAYERS_SCHEMA
+from teams import teams_dict
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraping_utils.checkpoint import CheckpointStore
+from scraping_utils.fetcher import Fetcher
+from scraping_utils.html_tables import BACKENDS, find_table, parse_html, table_columns, uncomment_tables
+from scraping_utils.ledger import LEDGER
+from scraping_utils.metrics import METRICS, SectionTimings, export_metrics
+from scraping_utils.page_cache import OfflineCacheMiss, PageCache
+from scraping_utils.parse_pool import ParsePool
+from scraping_utils.schemas import apply_schema
+from scraping_utils.sinks import TeeSink, open_sink
+
+# Gamelog tables, the id changed between site versions
+GAMELOG_TABLES = ['pgl_basic', 'player_game_log_reg']
+
+# data-stat of the gamelog cells and the box score column they fill
+GAMELOG_STATS = {'date_game': 'date', 'team_id': 'team_code', 'game_location': 'is_home', 'opp_id': 'rival_code',
+                 'game_result': 'result', 'gs': 'starting', 'mp': 'MP', 'fg': 'FG', 'fga': 'FGA', 'fg_pct': 'FG%',
+                 'fg3': '3P', 'fg3a': '3PA', 'fg3_pct': '3P%', 'ft': 'FT', 'fta': 'FTA', 'ft_pct': 'FT%',
+                 'orb': 'ORB', 'drb': 'DRB', 'trb': 'TRB', 'ast': 'AST', 'stl': 'STL', 'blk': 'BLK', 'tov': 'TOV',
+                 'pf': 'PF', 'pts': 'PTS', 'game_score': 'GmSc', 'plus_minus': '+/-', 'reason': 'reason'}
+
+GAMELOG_SCHEMA = {**PLAYERS_SCHEMA, 'team_code': 'category', 'rival_code': 'category', 'result': 'category'}
+
+class GamelogScraper:
+    # Every player's season gamelog holds his line for all the games he played,
+    # so one request per player and season backfills all of his box score rows
+    def __init__(self, players, cache=None, fetcher=None, backend='lxml', checkpoint=None, parse_workers=0):
+        self.urls = list(pd.unique(players['player_url'].dropna()))
+        self.backend = backend
+        self.checkpoint = checkpoint
+        self.fetcher = fetcher if fetcher else Fetcher(cache=cache)
+        self.timings = SectionTimings()
+        self.parse_pool = ParsePool(workers=parse_workers, timings=self.timings)
+
+        self.gamelogs = pd.DataFrame()
+
+    @staticmethod
+    def parse_gamelog(content, url, backend='lxml', timings=None):
+        # One row per game of the player, keyed by the box score url like the player logs
+        timings = timings if timings is not None else SectionTimings()
+        lap = timings.laps()
+        # The playoffs table is commented out
+        content = uncomment_tables(content)
+        if backend == 'lxml':
+            root = parse_html(content)
+            table = next((table for table in (find_table(root, table_id) for table_id in GAMELOG_TABLES) if table is not None), None)
+            if table is None:
+                timings.error('gamelog', 'no_table')
+                print(f'--- No gamelog table in {url} ---')
+                return None
+            rows = './tbody/tr[not(@class)]'
+            df = pd.DataFrame(table_columns(table, list(GAMELOG_STATS), rows=rows))
+            df['boxscore'] = [(row.xpath('./td[@data-stat="date_game"]/a/@href') or [None])[0] for row in table.xpath(rows)]
+        else:
+            soup = BeautifulSoup(content, 'html.parser')
+            table = next((table for table in (soup.find('table', id=table_id) for table_id in GAMELOG_TABLES) if table is not None), None)
+            if table is None:
+                timings.error('gamelog', 'no_table')
+                print(f'--- No gamelog table in {url} ---')
+                return None
+            records = []
+            for row in table.find('tbody').find_all('tr', class_ = False):
+                cells = {cell.get('data-stat'): cell for cell in row.find_all(['th', 'td'])}
+                record = {stat: cells[stat].text.strip() if stat in cells else None for stat in GAMELOG_STATS}
+                link = cells['date_game'].find('a') if 'date_game' in cells else None
+                record['boxscore'] = link['href'] if link else None
+                records.append(record)
+            df = pd.DataFrame.from_records(records, columns = list(GAMELOG_STATS) + ['boxscore'])
+        lap('gamelog')
+
+        df = df.rename(columns = GAMELOG_STATS)
+        df = df[df['boxscore'].notna()].reset_index(drop = True)
+        df['boxscore'] = 'https://www.basketball-reference.com' + df['boxscore']
+        df['player_url'] = url
+        df['is_home'] = (df['is_home'] != '@').astype(int)
+
+        # Games missed show the reason across the row, box scores keep it in MP
+        df['MP'] = df['MP'].where(df['reason'].isna(), df['reason'])
+        df = apply_schema(df.drop(columns = ['reason']), GAMELOG_SCHEMA)
+        lap('typing')
+        return df[['player_url', 'boxscore'] + [col for col in df.columns if col not in ['player_url', 'boxscore']]]
+
+    def run(self, sink=None):
+        # Gamelogs are written to sink as soon as they are parsed, otherwise they are kept in self.gamelogs
+
+        # Players finished in previous runs are read from the checkpoint instead of requested again
+        done = self.checkpoint.load() if self.checkpoint is not None else {}
+
+        def fetch_gamelog(url):
+            if url in done:
+                return url, None, ()
+            lap = self.timings.laps()
+            try:
+                req = self.fetcher.get(url)
+            except OfflineCacheMiss:
+                print(f"--- {url} is not cached, skipping ---")
+                return url, None, ()
+            lap('fetch')
+            if req.status_code != 200:
+                print(f'--- Request {url} failed with status: {req.status_code} ---')
+                return url, None, ()
+            return url, req.content, (url, self.backend)
+
+        # Requests are spaced according to Basketball Reference Terms & Conditions by the fetcher,
+        # every player and season url is requested once however many games it appears in
+        pages = self.fetcher.map(fetch_gamelog, self.urls)
+        chunks = []
+        for url, gamelog in tqdm(self.parse_pool.map(GamelogScraper.parse_gamelog, pages), total = len(self.urls), desc = "Getting gamelogs"):
+            if url in done:
+                gamelog = apply_schema(pd.DataFrame(done.rows(url)), GAMELOG_SCHEMA)
+            elif gamelog is None:
+                continue
+            elif self.checkpoint is not None:
+                self.checkpoint.append(url, gamelog)
+
+            if sink is not None:
+                lap = self.timings.laps()
+                sink.write(gamelog)
+                lap('write')
+            else:
+                chunks.append(gamelog)
+
+        if chunks:
+            self.gamelogs = apply_schema(pd.concat(chunks, axis = 0, ignore_index = True), GAMELOG_SCHEMA)
+
+    def backfill(self, players, gamelogs=None):
+        # Fills the stats missing in the player logs, and adds the games they lack, from the gamelogs.
+        # Games added take the player name from his other rows, the season from the gamelog url and the teams from their codes
+        gamelogs = self.gamelogs if gamelogs is None else gamelogs
+        keys = ['player_url', 'boxscore']
+        unify = lambda df: df.astype({col: object for col in df.columns[df.dtypes == 'category']}).set_index(keys)
+        filled = unify(players).combine_first(unify(gamelogs)).reset_index()
+
+        names = players.dropna(subset = ['player_url', 'player']).drop_duplicates('player_url').set_index('player_url')['player']
+        filled['player'] = filled['player'].fillna(filled['player_url'].map(names))
+        seasons = pd.to_numeric(filled['player_url'].str.extract(r'/gamelog/(\d+)', expand = False))
+        filled['season'] = filled['season'].fillna(seasons)
+        is_home = filled['is_home'] == 1
+        filled['team'] = filled['team'].fillna(filled['team_code'].map(teams_dict))
+        filled['rival'] = filled['rival'].fillna(filled['rival_code'].map(teams_dict))
+        filled['home_code'] = filled['home_code'].fillna(filled['team_code'].where(is_home, filled['rival_code']))
+        filled['away_code'] = filled['away_code'].fillna(filled['rival_code'].where(is_home, filled['team_code']))
+
+        columns = list(players.columns) + [col for col in filled.columns if col not in players.columns]
+        return apply_schema(filled[columns], GAMELOG_SCHEMA)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cache-dir', default='.page_cache')
+    parser.add_argument('--offline', action='store_true', help='Replay pages from the cache only')
+    parser.add_argument('--backend', choices=BACKENDS, default='lxml', help='HTML parser used to read the pages')
+    parser.add_argument('--players', default='players.csv', help='Player logs with the player_url column, as written by players_scraper.py')
+    parser.add_argument('--checkpoint', default='gamelogs_checkpoint.jsonl', help='Append-only store of finished gamelogs, used to resume runs')
+    parser.add_argument('--output', default='gamelogs.csv', help='Gamelogs file (.csv or .parquet), written player by player')
+    parser.add_argument('--backfill', help='Write the player logs with the stats and games of the gamelogs added to this file (.csv or .parquet)')
+    parser.add_argument('--ledger', default='requests_ledger.csv', help='Where to save the report of requested pages (.csv or .parquet)')
+    parser.add_argument('--metrics', default='metrics.jsonl', help='Where to export timings, counters and queue depths (.prom for the Prometheus text format)')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count(), help='Processes that parse the gamelogs, 0 parses them in the main process')
+    args = parser.parse_args()
+
+    players = apply_schema(pd.read_csv(args.players, usecols=None if args.backfill else ['player_url']), PLAYERS_SCHEMA)
+    Scraper = GamelogScraper(
+        players = players,
+        fetcher = Fetcher(cache=PageCache(path=args.cache_dir, offline=args.offline)),
+        backend = args.backend,
+        checkpoint = CheckpointStore(args.checkpoint),
+        parse_workers = args.parse_workers
+    )
+
+    # Run code, saving every player's gamelog to the output file and a parquet copy as soon as it is parsed
+    parquet = os.path.splitext(args.output)[0] + '.parquet'
+    outputs = sorted({args.output, parquet})
+    sink = TeeSink(*[open_sink(path) for path in outputs])
+    Scraper.run(sink=sink)
+    sink.close()
+
+    # Gamelogs are not kept in memory with a sink, the typed parquet copy is read back to backfill the player logs
+    if args.backfill:
+        backfilled = Scraper.backfill(players, gamelogs=pd.read_parquet(parquet))
+        backfill_sink = open_sink(args.backfill)
+        backfill_sink.write(backfilled)
+        backfill_sink.close()
+        print(f'--- {len(backfilled) - len(players)} games added to the {len(players)} player logs, see {args.backfill} ---')
+
+    # Save report of requested pages
+    LEDGER.save(args.ledger)
+    if LEDGER.duplicates():
+        print(f'--- {len(LEDGER.duplicates())} pages were requested more than once, see {args.ledger} ---')
+
+    # Save timings, extractor errors and request counters
+    export_metrics(args.metrics, Scraper.timings, METRICS)
+    if Scraper.timings.errors():
+        print(f'--- {Scraper.timings.errors()} stats could not be extracted, see {args.metrics} ---')
+
+if __name__ == '__main__':
+    main()
@@ -1,96 +1,203 @@
 import pandas as pd
-import requests
-from datetime import datetime
+import argparse
+import os
+import re
+import sys
 from io import StringIO
 from bs4 import BeautifulSoup
-from time import sleep
-from random import random
 from tqdm import tqdm
-from aux_functions import convert_time_format
+from aux_functions import add_game_datetimes
 from teams import teams_dict,teams_inv
+from season_calendar import SeasonCalendar
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraping_utils.fetcher import Fetcher
+from scraping_utils.html_tables import BACKENDS, find_table, parse_html, read_table, uncomment_tables
+from scraping_utils.ledger import LEDGER
+from scraping_utils.metrics import METRICS, SectionTimings, export_metrics
+from scraping_utils.page_cache import OfflineCacheMiss, PageCache
+from scraping_utils.refresh_planner import schedule_settled
+from scraping_utils.schemas import apply_schema
+from scraping_utils.sinks import write_parquet
+from scraping_utils.store import SqliteStore
+
+# Compact dtypes of the games, dates are parsed by add_game_datetimes
+GAMES_SCHEMA = {'season': 'Int16', 'away': 'category', 'away_code': 'category', 'away_pts': 'Int16',
+                'home': 'category', 'home_code': 'category', 'home_pts': 'Int16', 'overtime': 'category', 'type': 'category'}
 
 class GamesScraper:
-    def __init__(self, season):
+    def __init__(self, season, cache=None, fetcher=None, backend='lxml', calendar=None):
         self.season = season
+        self.backend = backend
+        self.fetcher = fetcher if fetcher else Fetcher(cache=cache)
+        self.calendar = calendar if calendar is not None else SeasonCalendar()
+        self.timings = SectionTimings()
         self.games = pd.DataFrame()
-        
-    def get_games(self, month):
-        req = requests.get(f'https://www.basketball-reference.com/leagues/NBA_{self.season}_games-{month.lower()}.html')
+
+    @staticmethod
+    def season_months(content, season, backend='lxml'):
+        # Month pages linked by the filter above the season schedule, in the order they are listed
+        if backend == 'lxml':
+            hrefs = parse_html(content).xpath('//div[contains(concat(" ", @class, " "), " filter ")]//a/@href')
+        else:
+            hrefs = [link.get('href', '') for link in BeautifulSoup(content, 'html.parser').select('div.filter a')]
+        pattern = re.compile(rf'NBA_{season}_games-([a-z0-9-]+)\.html')
+        months = [match.group(1) for match in map(pattern.search, hrefs) if match]
+        return list(dict.fromkeys(months))
+
+    def discover_months(self):
+        # The season index lists every month with games, including the ones still to be played
+        url = f'https://www.basketball-reference.com/leagues/NBA_{self.season}_games.html'
+        try:
+            req = self.fetcher.get(url)
+        except OfflineCacheMiss:
+            print(f'--- {url} is not cached, no months to get ---')
+            return []
+        if req.status_code != 200:
+            print(f'--- Request {url} failed with status: {req.status_code} ---')
+            return []
+        months = GamesScraper.season_months(req.content, self.season, self.backend)
+        if not months:
+            print(f'--- No month pages found in {url} ---')
+            return []
+        self.calendar.set_months(self.season, months)
+        return months
+
+    def get_games(self, month, final=False):
+        # Months whose games were all played don't change, any cached copy of them is used
+        lap = self.timings.laps()
+        req = self.fetcher.get(f'https://www.basketball-reference.com/leagues/NBA_{self.season}_games-{month.lower()}.html', stale_ok=final)
+        lap('fetch')
         if req.status_code==200:
+            content = uncomment_tables(req.content)
+            if self.backend == 'lxml':
+                # Read the table and the boxscore links straight from the lxml tree
+                table = find_table(parse_html(content), 'schedule')
+                month_games = read_table(table)
+
+                boxscore_links = []
+                for row in table.xpath('./tbody//tr[not(@class)]'):
+                    boxscore = row.xpath('./td[@data-stat="box_score_text"]/a/@href')
+                    boxscore_links.append('https://www.basketball-reference.com' + boxscore[0] if boxscore else None)
+                month_games['boxscore'] = boxscore_links
+                lap('schedule')
+                return month_games
+
             # Get table content
-            soup = BeautifulSoup(req.content, 'html.parser')
+            soup = BeautifulSoup(content, 'html.parser')
             table = soup.find('table', attrs={'id': 'schedule'})
             if table:
                 month_games = pd.read_html(StringIO(str(table)))[0]
                 
             # Get games urls
-            table = soup.find('table').find('tbody').findAll("tr", class_ = False)
+            rows = table.find('tbody').findAll("tr", class_ = False)
 
             boxscore_links = []
-            for row in table:
+            for row in rows:
                 try:
                     boxscore = row.find("td", attrs = {'data-stat':'box_score_text'}).find('a')['href']
                     boxscore_links.append('https://www.basketball-reference.com'+ boxscore)
                 except:
                     boxscore_links.append(None)
             month_games['boxscore'] = boxscore_links
+            lap('schedule')
             return month_games
         else:
             print(f'--- Request {self.season}-{month.lower()} failed with status: {req.status_code} ---')   
 
-    def run(self, playoffs=False):
-        # Seasons have different month associated with
-        if self.season==2020:
-            months = ['October-2019', 'November', 'December', 'January', 'February', 'March',
-                    'July', 'August', 'September', 'October-2020']
-        elif self.season==2021:
-            months = ['December', 'January', 'February', 'March', 'May', 'June',
-                    'July']
-        elif self.season==2024:
-            months = ['October', 'November', 'December', 'January']
-        else:
-            months = ['October', 'November', 'December', 'January', 'February', 'March',
-            'April', 'May', 'June']
+    def iter_months(self):
+        # Yields (month, games) of every month of the season as soon as its page is parsed, months that could
+        # not be read are skipped. Pages are requested as the months are consumed.
+        # Seasons have different months, they are read from the season index and kept in the calendar
+        months = self.calendar.months(self.season)
+        if months is None:
+            months = self.discover_months()
+        final = self.calendar.final(self.season)
 
-        for month in tqdm(months, desc = f'Getting games from season {self.season}'):
-            month_games = self.get_games(month)
-            self.games = pd.concat([self.games, month_games], axis = 0)
-            
-            # Sleeps for 3 seconds according to Basketball Reference Terms & Conditions.
-            sleep(3+random())
-        
-        self.games = self.games.reset_index(drop = True)
-        self.games = self.games.drop(['Unnamed: 6', 'Attend.', 'Arena'], axis=1)
-        self.games.columns = ['date', 'start_time', 'away', 'away_pts', 'home', 'home_pts', 'overtime', 'type', 'boxscore']
+        def month_games(month):
+            try:
+                return self.get_games(month, final = month in final)
+            except OfflineCacheMiss:
+                print(f'--- {self.season}-{month.lower()} is not cached, skipping ---')
 
-        self.games['season'] = self.season
+        # Requests are spaced according to Basketball Reference Terms & Conditions by the fetcher
+        played = []
+        for month, games in zip(months, tqdm(self.fetcher.map(month_games, months), total = len(months), desc = f'Getting games from season {self.season}')):
+            if games is None:
+                continue
+            games = games.drop(['Unnamed: 6', 'Attend.', 'Arena'], axis=1)
+            games.columns = ['date', 'start_time', 'away', 'away_pts', 'home', 'home_pts', 'overtime', 'type', 'boxscore']
+            if schedule_settled(pd.to_datetime(games['date'], format='%a, %b %d, %Y', errors='coerce'), games['boxscore'].notna()):
+                played.append(month)
+            games['season'] = self.season
+            yield month, apply_schema(games, GAMES_SCHEMA)
 
+        # Months with a box score for every game, the last one a few days ago, are over.
+        # Later runs only request the current and future months
+        if set(played) - final:
+            self.calendar.mark_final(self.season, played)
 
-def main():
-    # Run code for every season
-    seasons = [2023, 2024]
-    df = pd.DataFrame()
-    for season in seasons:
-        Scraper = GamesScraper(season = season)
-        Scraper.run(season)
-        df = pd.concat([df, Scraper.games], axis=0)
-    
-    # Cleaning
-    df['start_time'] = df['start_time'].apply(convert_time_format)
-    df['datetime'] = df['date'] + ' ' +  df['start_time']
+    def iter_games(self):
+        # Games of every month, typed and with the columns of games.csv, as soon as its page is parsed
+        for month, games in self.iter_months():
+            yield clean_games(games)
 
-    df['date'] = df['date'].apply(lambda x: datetime.strptime(x, "%a, %b %d, %Y"))
-    df['datetime'] = df['datetime'].apply(lambda x: datetime.strptime(x, "%a, %b %d, %Y %H:%M:%S"))
+    def run(self, playoffs=False):
+        months_games = [games for month, games in self.iter_months()]
+        if not months_games:
+            print(f'--- No games found for season {self.season} ---')
+            return
+        self.games = pd.concat([self.games] + months_games, axis = 0)
+        self.games = apply_schema(self.games.reset_index(drop = True), GAMES_SCHEMA)
 
-    df['timestamp'] = df['datetime'].apply(lambda x: int(x.timestamp()))
+def clean_games(df):
+    # Dates, team codes and the columns of games.csv from the games of GamesScraper.run
+    df = add_game_datetimes(df)
 
     df['away_code'] = df['away'].map(teams_inv)
     df['home_code'] = df['home'].map(teams_inv)
     
     df = df[['date', 'datetime', 'timestamp', 'season', 'away', 'away_code', 'away_pts', 'home', 'home_code', 'home_pts', 'overtime', 'type', 'boxscore']]
+    return apply_schema(df, GAMES_SCHEMA)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cache-dir', default='.page_cache')
+    parser.add_argument('--offline', action='store_true', help='Replay pages from the cache only')
+    parser.add_argument('--backend', choices=BACKENDS, default='lxml', help='HTML parser used to read the pages')
+    parser.add_argument('--calendar', default='season_calendar.json', help='Where to keep the month pages found for every season')
+    parser.add_argument('--ledger', default='requests_ledger.csv', help='Where to save the report of requested pages (.csv or .parquet)')
+    parser.add_argument('--db', help='SQLite database the games are upserted into, only changed rows are written')
+    parser.add_argument('--metrics', default='metrics.jsonl', help='Where to export timings, counters and queue depths (.prom for the Prometheus text format)')
+    args = parser.parse_args()
+    fetcher = Fetcher(cache=PageCache(path=args.cache_dir, offline=args.offline))
+    calendar = SeasonCalendar(args.calendar)
+
+    # Run code for every season
+    seasons = [2023, 2024]
+    seasons_games = []
+    timings = SectionTimings()
+    for season in seasons:
+        Scraper = GamesScraper(season = season, fetcher = fetcher, backend = args.backend, calendar = calendar)
+        Scraper.run(season)
+        seasons_games.append(Scraper.games)
+        timings.merge(Scraper.timings.state())
+    df = clean_games(pd.concat(seasons_games, axis=0))
     
-    # Save file
+    # Save file, and a parquet copy with its dtypes
     df.to_csv('games.csv', index=False)
+    write_parquet(df, 'games.parquet')
+    if args.db:
+        store = SqliteStore(args.db)
+        print(f"{store.upsert('nba_games', df)} games written to {args.db}")
+        store.close()
+
+    # Save report of requested pages
+    LEDGER.save(args.ledger)
+    if LEDGER.duplicates():
+        print(f'--- {len(LEDGER.duplicates())} pages were requested more than once, see {args.ledger} ---')
+
+    # Save timings and request counters
+    export_metrics(args.metrics, timings, METRICS)
 
 if __name__ == '__main__':
     main()
@@ -1,130 +1,336 @@
 import pandas as pd
-import requests
+import pyarrow as pa
+import argparse
+import os
+import sys
 from bs4 import BeautifulSoup
 from io import StringIO
-from time import sleep
-from random import random
 from tqdm import tqdm
 from teams import teams_dict, teams_inv
-from aux_functions import assign_teams
+from aux_functions import assign_teams_vectorized
+from games_scraper import GAMES_SCHEMA
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraping_utils.artifact_cache import ArtifactCache
+from scraping_utils.checkpoint import CheckpointStore, since_date
+from scraping_utils.fetcher import Fetcher
+from scraping_utils.html_tables import BACKENDS, find_table, parse_html, row_texts, uncomment_tables
+from scraping_utils.ledger import LEDGER
+from scraping_utils.metrics import METRICS, SectionTimings, export_metrics
+from scraping_utils.page_cache import OfflineCacheMiss, PageCache
+from scraping_utils.parse_pool import ParsePool
+from scraping_utils.schemas import apply_schema
+from scraping_utils.sinks import TeeSink, open_sink
+from scraping_utils.store import SqliteStore, StoreSink
+
+# Compact dtypes of the player logs. Stats of players who did not play are missing, MP keeps the reason
+COUNT_STATS = ['FG', 'FGA', '3P', '3PA', 'FT', 'FTA', 'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS', '+/-']
+RATE_STATS = ['FG%', '3P%', 'FT%', 'GmSc', 'TS%', 'eFG%', '3PAr', 'FTr', 'ORB%', 'DRB%', 'TRB%', 'AST%', 'STL%', 'BLK%', 'TOV%', 'USG%', 'ORtg', 'DRtg', 'BPM']
+PLAYERS_SCHEMA = {**GAMES_SCHEMA, 'date': 'datetime64[ns]', 'datetime': 'datetime64[ns]',
+                  'player': 'category', 'player_url': 'category', 'team': 'category', 'rival': 'category',
+                  'pts_team': 'Int16', 'pts_rival': 'Int16', 'starting': 'Int8', 'is_home': 'Int8',
+                  **{stat + suffix: 'Int16' for stat in COUNT_STATS for suffix in ['', '_team', '_rival']},
+                  **{stat + suffix: 'float32' for stat in RATE_STATS for suffix in ['', '_team', '_rival']}}
+
+# Version of the box score tables stored as artifacts, bump it when box_table changes to drop the stored ones
+BOX_TABLES_VERSION = 1
+
+# Columns of the team totals that only make sense for players
+TOTALS_DROP = ['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%', 'BPM']
+
+def box_table(table):
+    # Labels, player ids and hrefs, player rows and team totals of a basic or advanced box score table.
+    # Rows are cell texts in header order, a cell spanning several columns (Did Not Play) fills all of them
+    labels = row_texts(table.xpath('./thead/tr')[-1])
+    pad = lambda texts: [text or None for text in texts] + [None] * (len(labels) - len(texts))
+    ids, hrefs, rows = [], [], []
+    for tr in table.xpath('./tbody/tr[not(@class)]'):
+        texts = row_texts(tr)
+        player = tr.xpath('./th')
+        ids.append(player[0].get('data-append-csv') if player and player[0].get('data-append-csv') else texts[0])
+        hrefs.append((tr.xpath('./th//a/@href') or [None])[0])
+        rows.append(pad(texts))
+    totals = pad(row_texts(table.xpath('./tfoot/tr')[0]))
+    return labels, ids, hrefs, rows, totals
+
+def box_to_arrow(box):
+    # A box_table as an Arrow table of strings, the team totals are the last row
+    labels, ids, hrefs, rows, totals = box
+    rows = rows + [totals]
+    arrays = [pa.array([row[i] for row in rows], pa.string()) for i in range(len(labels))]
+    arrays += [pa.array(ids + [None], pa.string()), pa.array(hrefs + [None], pa.string())]
+    return pa.Table.from_arrays(arrays, names=labels + ['_id', '_href'])
+
+def box_from_arrow(table):
+    columns = [column.to_pylist() for column in table.columns]
+    rows = [list(row) for row in zip(*columns[:-2])]
+    return table.column_names[:-2], columns[-2][:-1], columns[-1][:-1], rows[:-1], rows[-1]
+
+def box_side(basic, advanced, is_home):
+    # Player columns of one team, advanced stats aligned to the basic rows by player id, and its totals
+    labels, ids, hrefs, rows, totals = basic
+    advanced_labels, advanced_ids, _, advanced_rows, advanced_totals = advanced
+    extra = [(i, label) for i, label in enumerate(advanced_labels) if label not in labels]
+    advanced_rows = dict(zip(advanced_ids, advanced_rows))
+    missing = [None] * len(advanced_labels)
+
+    columns = {label: [row[i] for row in rows] for i, label in enumerate(labels)}
+    columns['starting'] = [1 if n < 5 else 0 for n in range(len(rows))]
+    columns['is_home'] = [is_home] * len(rows)
+    for i, label in extra:
+        columns[label] = [advanced_rows.get(player_id, missing)[i] for player_id in ids]
+
+    team_totals = {**dict(zip(labels, totals)), **{label: advanced_totals[i] for i, label in extra}}
+    return columns, {label: value for label, value in team_totals.items() if label not in TOTALS_DROP}, hrefs
 
 class PlayerLogScraper:
-    def __init__(self, games):
+    def __init__(self, games, cache=None, fetcher=None, backend='lxml', checkpoint=None, parse_workers=0, artifacts=None):
         self.games = games
+        self.backend = backend
+        self.checkpoint = checkpoint
+        self.artifacts = artifacts
+        self.fetcher = fetcher if fetcher else Fetcher(cache=cache)
+        self.timings = SectionTimings()
+        self.parse_pool = ParsePool(workers=parse_workers, timings=self.timings)
         
         self.players = pd.DataFrame()
         
     def get_match_players_stats(self, url, away_code, home_code, season):
         # Request Game URL
-        req = requests.get(url)
+        lap = self.timings.laps()
+        req = self.fetcher.get(url)
+        lap('fetch')
         if req.status_code==200:
-            # Get the 4 tables (2 for basic and advanced stats for home and away teams)
-            soup = BeautifulSoup(req.content, 'html.parser')
-            away_basic_html = soup.find_all('table', id="box-" + away_code + "-game-basic")[0]
-            away_basic = pd.read_html(StringIO(str(away_basic_html)))[0]
-            away_advanced_html = soup.find_all('table', id="box-" + away_code + "-game-advanced")[0]
-            away_advanced = pd.read_html(StringIO(str(away_advanced_html)))[0]
-            
-            home_basic_html = soup.find_all('table', id="box-" + home_code + "-game-basic")[0]
-            home_basic = pd.read_html(StringIO(str(home_basic_html)))[0]
-            home_advanced_html = soup.find_all('table', id="box-" + home_code + "-game-advanced")[0]
-            home_advanced = pd.read_html(StringIO(str(home_advanced_html)))[0]
-
-            # Merge columns based on players names
-            home_basic.columns = home_basic.columns.droplevel()
-            home_basic["starting"] = [1]*5 + [0]*(len(home_basic)-5)
-            home_basic['is_home'] = 1
-            home_advanced.columns = home_advanced.columns.droplevel()
-            
-            home = pd.merge(home_basic, home_advanced, on = 'Starters', how = 'outer', suffixes =('','_y'))
-            home = home.drop(columns=home.filter(like='_y').columns)
-            
-            away_basic.columns = away_basic.columns.droplevel()
-            away_basic["starting"] = [1]*5 + [0]*(len(away_basic)-5)
-            away_basic['is_home'] = 0
-            away_advanced.columns = away_advanced.columns.droplevel()
-            
-            away = pd.merge(away_basic, away_advanced, on = 'Starters', how = 'outer', suffixes =('','_y'))
-            away = away.drop(columns=away.filter(like='_y').columns)
-            
-            # Clean columns and create their own variables
-            home_totals = home[home['Starters'] == 'Team Totals']
-            away_totals = away[away['Starters'] == 'Team Totals']
-            
-            home_totals_team = pd.concat([home_totals] * (len(home)-2), ignore_index=True)
-            home_totals_team = home_totals_team.drop(columns=['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%', 'BPM']).add_suffix('_team')
-            home_totals_rival = pd.concat([away_totals] * (len(home)-2), ignore_index=True)
-            home_totals_rival = home_totals_rival.drop(columns=['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%', 'BPM']).add_suffix('_rival')
-            
-            away_totals_team = pd.concat([away_totals] * (len(away)-2), ignore_index=True)
-            away_totals_team = away_totals_team.drop(columns=['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%','BPM']).add_suffix('_team')
-            away_totals_rival = pd.concat([home_totals] * (len(away)-2), ignore_index=True)
-            away_totals_rival = away_totals_rival.drop(columns=['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%','BPM']).add_suffix('_rival')
-            
-            # Concat all columns for both home and away
-            home = home[~home['Starters'].isin(['Team Totals', 'Reserves'])].reset_index(drop = True)
-            home = pd.concat([home, home_totals_team, home_totals_rival], axis = 1)
-            
-            away = away[~away['Starters'].isin(['Team Totals', 'Reserves'])].reset_index(drop = True)
-            away = pd.concat([away, away_totals_team, away_totals_rival], axis = 1)
-            
-            # Get Home Players URL
-            home_players = home_basic_html.find('tbody').find_all('tr', class_ = False)
-            home_players_url = []
-            for player in home_players:
-                player_url = player.find('th').find('a')['href'].replace('.html', f'/gamelog/{season}')
-                home_players_url.append("https://www.basketball-reference.com" + player_url)
-            try:
-                home['player_url'] = home_players_url
-            except:
-                print(f"Error while getting home players url in game: {url}")
-                
-            # Get Away Players URL
-            away_players = away_basic_html.find('tbody').find_all('tr', class_ = False)
-            away_players_url = []
-            for player in away_players:
-                player_url = player.find('th').find('a')['href'].replace('.html', f'/gamelog/{season}')
-                away_players_url.append("https://www.basketball-reference.com" + player_url)
-            try:
-                away['player_url'] = away_players_url
-            except:
-                print(f"Error while getting away players url in game: {url}")
-                
-            # Concat home and away df in a unique df
-            df = pd.concat([home,away], ignore_index = True)
-            return df
+            return PlayerLogScraper.parse_match_players(req.content, url, away_code, home_code, season, self.backend, self.artifacts, self.timings)
         else:
             print(f'--- Request {url} failed with status: {req.status_code} ---')   
 
-    def run(self):
-        for index, row in tqdm(self.games.iterrows(), desc = "Getting game stats"):
-            # Get match stats
-            players_df = self.get_match_players_stats(row['boxscore'], row['away_code'], row['home_code'], row['season'])
-            
-            # Merge match stats with the data in  games df
-            rows = pd.concat([pd.DataFrame([row])] * len(players_df), ignore_index = True)
-            players_df = pd.merge(rows, players_df, left_index=True, right_index=True)	
-            
-            # Add rows to the players df
-            self.players = pd.concat([self.players, players_df], axis = 0, ignore_index = True)
-            
-            # Sleeps for 3 seconds according to Basketball Reference Terms & Conditions.
-            sleep(3 + random())
+    @staticmethod
+    def parse_match_players(content, url, away_code, home_code, season, backend='lxml', artifacts=None, timings=None):
+        # Static so parse worker processes can run it without the scraper
+        timings = timings if timings is not None else SectionTimings()
+        lap = timings.laps()
+
+        if backend == 'lxml':
+            return PlayerLogScraper.parse_box_tables(content, url, away_code, home_code, season, artifacts, timings)
+
+        # Get the 4 tables (2 for basic and advanced stats for home and away teams)
+        soup = BeautifulSoup(uncomment_tables(content), 'html.parser')
+        away_basic_html = soup.find_all('table', id="box-" + away_code + "-game-basic")[0]
+        away_basic = pd.read_html(StringIO(str(away_basic_html)))[0]
+        away_advanced_html = soup.find_all('table', id="box-" + away_code + "-game-advanced")[0]
+        away_advanced = pd.read_html(StringIO(str(away_advanced_html)))[0]
+
+        home_basic_html = soup.find_all('table', id="box-" + home_code + "-game-basic")[0]
+        home_basic = pd.read_html(StringIO(str(home_basic_html)))[0]
+        home_advanced_html = soup.find_all('table', id="box-" + home_code + "-game-advanced")[0]
+        home_advanced = pd.read_html(StringIO(str(home_advanced_html)))[0]
+        lap('tables')
+
+        # Merge columns based on players names
+        home_basic.columns = home_basic.columns.droplevel()
+        home_basic["starting"] = [1]*5 + [0]*(len(home_basic)-5)
+        home_basic['is_home'] = 1
+        home_advanced.columns = home_advanced.columns.droplevel()
+        
+        home = pd.merge(home_basic, home_advanced, on = 'Starters', how = 'outer', suffixes =('','_y'))
+        home = home.drop(columns=home.filter(like='_y').columns)
+        
+        away_basic.columns = away_basic.columns.droplevel()
+        away_basic["starting"] = [1]*5 + [0]*(len(away_basic)-5)
+        away_basic['is_home'] = 0
+        away_advanced.columns = away_advanced.columns.droplevel()
         
-        self.players = self.players.apply(assign_teams, axis=1).drop(columns = ['home', 'home_pts', 'away', 'away_pts'])
-        self.players.rename(columns = {'Starters':'player'}, inplace = True)
-        self.players = self.players[['player', 'player_url', 'team', 'rival', 'pts_team', 'pts_rival'] + [col for col in self.players.columns if col not in ['player', 'player_url', 'team', 'rival', 'pts_team', 'pts_rival']]]
+        away = pd.merge(away_basic, away_advanced, on = 'Starters', how = 'outer', suffixes =('','_y'))
+        away = away.drop(columns=away.filter(like='_y').columns)
+        
+        # Clean columns and create their own variables
+        home_totals = home[home['Starters'] == 'Team Totals']
+        away_totals = away[away['Starters'] == 'Team Totals']
+        
+        home_totals_team = pd.concat([home_totals] * (len(home)-2), ignore_index=True)
+        home_totals_team = home_totals_team.drop(columns=['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%', 'BPM']).add_suffix('_team')
+        home_totals_rival = pd.concat([away_totals] * (len(home)-2), ignore_index=True)
+        home_totals_rival = home_totals_rival.drop(columns=['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%', 'BPM']).add_suffix('_rival')
+        
+        away_totals_team = pd.concat([away_totals] * (len(away)-2), ignore_index=True)
+        away_totals_team = away_totals_team.drop(columns=['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%','BPM']).add_suffix('_team')
+        away_totals_rival = pd.concat([home_totals] * (len(away)-2), ignore_index=True)
+        away_totals_rival = away_totals_rival.drop(columns=['Starters', 'MP', '+/-', 'starting', 'is_home', 'USG%','BPM']).add_suffix('_rival')
+        
+        # Concat all columns for both home and away
+        home = home[~home['Starters'].isin(['Team Totals', 'Reserves'])].reset_index(drop = True)
+        home = pd.concat([home, home_totals_team, home_totals_rival], axis = 1)
+        
+        away = away[~away['Starters'].isin(['Team Totals', 'Reserves'])].reset_index(drop = True)
+        away = pd.concat([away, away_totals_team, away_totals_rival], axis = 1)
+        
+        lap('merge')
+
+        # Get players URL, matched by name since the outer merges sort the players by name
+        for side, players, table in [('home', home, home_basic_html), ('away', away, away_basic_html)]:
+            try:
+                links = {row.find('th').find('a').text: row.find('th').find('a')['href'] for row in table.find('tbody').find_all('tr', class_ = False)}
+                players['player_url'] = ["https://www.basketball-reference.com" + links[player].replace('.html', f'/gamelog/{season}') for player in players['Starters']]
+            except Exception as exc:
+                timings.error(side + '_player_urls', exc)
+            
+        lap('player_urls')
+
+        # Concat home and away df in a unique df
+        df = pd.concat([home,away], ignore_index = True)
+        return df
+
+    @staticmethod
+    def parse_box_tables(content, url, away_code, home_code, season, artifacts=None, timings=None):
+        # Reads the four tables straight into columns, advanced stats are aligned to the basic ones by the players'
+        # data-append-csv id and the team totals are repeated for every player, in a single DataFrame construction.
+        # With artifacts, box scores parsed before are read from their stored tables instead of the HTML
+        timings = timings if timings is not None else SectionTimings()
+        lap = timings.laps()
+        keys = [(code, kind) for code in [home_code, away_code] for kind in ['basic', 'advanced']]
+        stored = artifacts.load('boxscore', BOX_TABLES_VERSION, url, content) if artifacts is not None else None
+        if stored is not None:
+            tables = {(code, kind): box_from_arrow(stored[f'{code}-{kind}']) for code, kind in keys}
+            timings.count('artifacts', status='hit', kind='boxscore')
+        else:
+            root = parse_html(uncomment_tables(content))
+            tables = {(code, kind): box_table(find_table(root, f'box-{code}-game-{kind}')) for code, kind in keys}
+            if artifacts is not None:
+                artifacts.store('boxscore', BOX_TABLES_VERSION, url, content, {f'{code}-{kind}': box_to_arrow(box) for (code, kind), box in tables.items()})
+                timings.count('artifacts', status='miss', kind='boxscore')
+        lap('tables')
+
+        home, home_totals, home_hrefs = box_side(tables[(home_code, 'basic')], tables[(home_code, 'advanced')], 1)
+        away, away_totals, away_hrefs = box_side(tables[(away_code, 'basic')], tables[(away_code, 'advanced')], 0)
+        n_home, n_away = len(home['starting']), len(away['starting'])
+
+        columns = {label: home[label] + away.get(label, [None] * n_away) for label in home}
+        for label in home_totals:
+            columns[label + '_team'] = [home_totals[label]] * n_home + [away_totals.get(label)] * n_away
+        for label in home_totals:
+            columns[label + '_rival'] = [away_totals.get(label)] * n_home + [home_totals[label]] * n_away
+        columns['player_url'] = [None if href is None else "https://www.basketball-reference.com" + href.replace('.html', f'/gamelog/{season}') for href in home_hrefs + away_hrefs]
+        lap('merge')
+        return pd.DataFrame(columns)
+
+    @staticmethod
+    def with_game(row, players_df):
+        # Game fields repeated for every player of the game, next to the players' stats
+        game = pd.DataFrame({col: [value] * len(players_df) for col, value in row.items()})
+        return pd.concat([game, players_df.reset_index(drop = True)], axis = 1)
+
+    def finalize(self, players):
+        # Team and rival columns from the point of view of every player
+        players = assign_teams_vectorized(players).drop(columns = ['home', 'home_pts', 'away', 'away_pts'])
+        players = apply_schema(players.rename(columns = {'Starters':'player'}), PLAYERS_SCHEMA)
+        return players[['player', 'player_url', 'team', 'rival', 'pts_team', 'pts_rival'] + [col for col in players.columns if col not in ['player', 'player_url', 'team', 'rival', 'pts_team', 'pts_rival']]]
+
+    def run(self, since=None, sink=None):
+        # Every game's rows are written to sink as soon as they are parsed, otherwise they are kept in self.players
+        chunks = []
+        for players_df in self.iter_player_rows(since):
+            if sink is not None:
+                lap = self.timings.laps()
+                sink.write(players_df)
+                lap('write')
+            else:
+                chunks.append(players_df)
+
+        # Single concat at the end instead of copying the growing frame for every game
+        if chunks:
+            self.players = apply_schema(pd.concat(chunks, axis = 0, ignore_index = True), PLAYERS_SCHEMA)
+
+    def iter_player_rows(self, since=None):
+        # Yields the typed player rows of every game as soon as its box score is parsed. Box scores are requested
+        # as the games are consumed, only a few ahead, so memory stays bounded however long the backfill is
+
+        # Games finished in previous runs are read from the checkpoint instead of requested again
+        done = self.checkpoint.load() if self.checkpoint is not None else {}
+        if since is not None:
+            self.games = self.games[(pd.to_datetime(self.games['date']) >= since) | self.games['boxscore'].isin(done)].reset_index(drop = True)
+
+        def fetch_boxscore(row):
+            url = row['boxscore']
+            # Games not played yet have no box score, they are requested once they are played
+            if url in done or pd.isna(url):
+                return row, None, ()
+            lap = self.timings.laps()
+            try:
+                req = self.fetcher.get(url)
+            except OfflineCacheMiss:
+                print(f"--- {url} is not cached, skipping ---")
+                return row, None, ()
+            lap('fetch')
+            if req.status_code != 200:
+                print(f'--- Request {url} failed with status: {req.status_code} ---')
+                return row, None, ()
+            return row, req.content, (url, row['away_code'], row['home_code'], row['season'], self.backend, self.artifacts)
+
+        def match_players(row, players_df):
+            if row['boxscore'] in done:
+                return self.finalize(pd.DataFrame(done.rows(row['boxscore'])))
+            if players_df is None:
+                return None
+
+            players_df = PlayerLogScraper.with_game(row, players_df)
+            if self.checkpoint is not None:
+                self.checkpoint.append(row['boxscore'], players_df, date=row['date'])
+            return self.finalize(players_df)
+
+        # Requests are spaced according to Basketball Reference Terms & Conditions by the fetcher,
+        # the downloaded box scores are parsed by the parse pool while the next ones are requested
+        pages = self.fetcher.map(fetch_boxscore, [row for index, row in self.games.iterrows()])
+        for row, players_df in tqdm(self.parse_pool.map(PlayerLogScraper.parse_match_players, pages), total = len(self.games), desc = "Getting game stats"):
+            players_df = match_players(row, players_df)
+            if players_df is not None:
+                yield players_df
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cache-dir', default='.page_cache')
+    parser.add_argument('--offline', action='store_true', help='Replay pages from the cache only')
+    parser.add_argument('--backend', choices=BACKENDS, default='lxml', help='HTML parser used to read the pages')
+    parser.add_argument('--artifact-dir', default='.artifact_cache', help='Tables read from every box score, extracting new columns reads them instead of the pages')
+    parser.add_argument('--checkpoint', default='players_checkpoint.jsonl', help='Append-only store of finished games, used to resume runs')
+    parser.add_argument('--since', help="Only scrape games played from this date on, or 'last' for the newest stored game")
+    parser.add_argument('--output', default='players.csv', help='Player logs file (.csv or .parquet), written game by game')
+    parser.add_argument('--ledger', default='requests_ledger.csv', help='Where to save the report of requested pages (.csv or .parquet)')
+    parser.add_argument('--db', help='SQLite database the player logs are upserted into game by game, only changed rows are written')
+    parser.add_argument('--metrics', default='metrics.jsonl', help='Where to export timings, counters and queue depths (.prom for the Prometheus text format)')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count(), help='Processes that parse the box scores, 0 parses them in the main process')
+    args = parser.parse_args()
+
     Scraper = PlayerLogScraper(
-        games = pd.read_csv('nba_scraper/games.csv')
+        games = pd.read_csv('nba_scraper/games.csv'),
+        fetcher = Fetcher(cache=PageCache(path=args.cache_dir, offline=args.offline)),
+        backend = args.backend,
+        checkpoint = CheckpointStore(args.checkpoint),
+        parse_workers = args.parse_workers,
+        artifacts = ArtifactCache(args.artifact_dir)
     )
     
-    # Run code
-    Scraper.run()
-    
-    # Save players df to csv
-    Scraper.players.to_csv('players.csv', index=False)
+    # Run code, saving every game's players to the output file and a parquet copy as soon as it is parsed
+    outputs = sorted({args.output, os.path.splitext(args.output)[0] + '.parquet'})
+    sinks = [open_sink(path) for path in outputs]
+    store = SqliteStore(args.db) if args.db else None
+    if store is not None:
+        sinks.append(StoreSink(store, 'nba_players'))
+    sink = TeeSink(*sinks)
+    Scraper.run(since=since_date(args.since, Scraper.checkpoint), sink=sink)
+    sink.close()
+    if store is not None:
+        print(f'{sinks[-1].rows} player rows written to {args.db}')
+        store.close()
+
+    # Save report of requested pages
+    LEDGER.save(args.ledger)
+    if LEDGER.duplicates():
+        print(f'--- {len(LEDGER.duplicates())} pages were requested more than once, see {args.ledger} ---')
+
+    # Save timings, extractor errors and request counters
+    export_metrics(args.metrics, Scraper.timings, METRICS)
+    if Scraper.timings.errors():
+        print(f'--- {Scraper.timings.errors()} stats could not be extracted, see {args.metrics} ---')
 
 if __name__ == '__main__':
 	main()
@@ -0,0 +1,56 @@
+import json
+import os
+import threading
+import time
+from datetime import date
+
+# Seasons still being played are discovered again after this many seconds, months can be added to them
+CALENDAR_TTL = 12 * 3600
+
+def season_finished(season):
+    # Every season, the 2020 bubble included, is over by the end of its second calendar year
+    return date.today() >= date(season + 1, 1, 1)
+
+
+class SeasonCalendar:
+    # Month pages of every season, as listed by the season index, and the months whose games were all played.
+    # Kept in a json file so later runs neither request the index nor the finished months again
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.seasons = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.seasons = json.load(f)
+
+    def months(self, season):
+        # None when the season has to be discovered again
+        entry = self.seasons.get(str(season))
+        if entry is None or 'months' not in entry:
+            return None
+        if season_finished(season) or time.time() - entry['discovered_at'] < CALENDAR_TTL:
+            return entry['months']
+        return None
+
+    def final(self, season):
+        return set(self.seasons.get(str(season), {}).get('final', []))
+
+    def set_months(self, season, months):
+        with self.lock:
+            entry = self.seasons.setdefault(str(season), {'final': []})
+            entry.update(months=months, discovered_at=time.time())
+            self.save()
+
+    def mark_final(self, season, months):
+        with self.lock:
+            entry = self.seasons.setdefault(str(season), {'final': []})
+            entry['final'] = sorted(set(entry['final']) | set(months))
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.seasons, f, indent=1)
+        os.replace(tmp, self.path)
@@ -0,0 +1,58 @@
+import hashlib
+import os
+import shutil
+import uuid
+import pyarrow as pa
+
+
+class ArtifactCache:
+    # Second cache tier with what the parsers read from every page (raw tables, sections) as Arrow IPC files.
+    # Artifacts are keyed by url, digest of the page and version of the parser that built them, so extracting
+    # new columns from pages already parsed maps the files instead of parsing the HTML again.
+    # Storing under a new parser version drops the artifacts of the older ones.
+    # Only holds its path, so parse worker processes get it along with the pages
+    def __init__(self, path='.artifact_cache'):
+        self.path = path
+
+    def key_path(self, kind, version, url, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha256(content).hexdigest()
+        key = hashlib.sha256(f'{url}\n{digest}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, kind, str(version), key[:2], key)
+
+    def load(self, kind, version, url, content):
+        # Tables stored for the page by name, None if this version of the parser didn't store them yet
+        path = self.key_path(kind, version, url, content)
+        if not os.path.isdir(path):
+            return None
+        # The tables keep the maps open, nothing is read until their columns are
+        return {name[:-len('.arrow')]: pa.ipc.open_file(pa.memory_map(os.path.join(path, name))).read_all()
+                for name in os.listdir(path) if name.endswith('.arrow')}
+
+    def store(self, kind, version, url, content, tables):
+        self.drop_versions(kind, version)
+        path = self.key_path(kind, version, url, content)
+        if os.path.isdir(path):
+            return
+
+        # Written to a temporary directory and renamed, readers never see half the tables of a page
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        os.makedirs(tmp)
+        for name, table in tables.items():
+            with pa.OSFile(os.path.join(tmp, name + '.arrow'), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Stored by another worker in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def drop_versions(self, kind, version):
+        kind_path = os.path.join(self.path, kind)
+        if os.path.isdir(os.path.join(kind_path, str(version))):
+            return
+        if os.path.isdir(kind_path):
+            for old in os.listdir(kind_path):
+                shutil.rmtree(os.path.join(kind_path, old), ignore_errors=True)
@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+import pandas as pd
+
+
+class CheckpointIndex(dict):
+    # Urls stored in a checkpoint and the offset of their latest entry in the file. Their rows are read
+    # back one url at a time when they are replayed, a resumed run never holds the whole checkpoint
+    def __init__(self, path, offsets=()):
+        super().__init__(offsets)
+        self.path = path
+
+    def rows(self, url):
+        with open(self.path, 'rb') as f:
+            f.seek(self[url])
+            return json.loads(f.readline())['rows']
+
+
+class CheckpointStore:
+    # Append-only JSON lines file with the rows scraped from every finished page, keyed by its url
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def entries(self):
+        # (offset, entry) of every line
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    yield offset, json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line of a run that was killed while writing
+                    pass
+                offset += len(line)
+
+    def load(self, accept=None):
+        # Index of the stored urls, later entries replace earlier ones. Urls whose latest entry
+        # accept(entry) rejects are left out, so they are scraped again
+        offsets = {}
+        for offset, entry in self.entries():
+            offsets[entry['url']] = offset if accept is None or accept(entry) else None
+        return CheckpointIndex(self.path, {url: offset for url, offset in offsets.items() if offset is not None})
+
+    def latest(self):
+        dates = [entry['date'] for offset, entry in self.entries() if entry.get('date')]
+        return max(pd.to_datetime(dates)) if dates else None
+
+    def append(self, url, rows, date=None):
+        if isinstance(rows, pd.DataFrame):
+            rows = json.loads(rows.to_json(orient='records', date_format='iso'))
+        line = json.dumps({'url': url, 'date': None if date is None else str(date), 'rows': rows}, default=str)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def since_date(value, checkpoint):
+    # --since takes a date or 'last' for the newest game already stored
+    if value is None:
+        return None
+    if value == 'last':
+        return checkpoint.latest() if checkpoint is not None else None
+    return pd.Timestamp(value)
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.exceptions import RequestException
+from scraping_utils.http_session import SESSION
+from scraping_utils.ledger import LEDGER
+from scraping_utils.metrics import METRICS
+from scraping_utils.page_cache import CachedResponse, OfflineCacheMiss, fetch
+
+# Allowed requests per second for every host. FBREF and Basketball Reference ask for
+# no more than 20 requests per minute, the old sleep(3 + random()) averaged one every 3.5 seconds.
+DEFAULT_RATES = {
+    'fbref.com': 1 / 3.5,
+    'www.basketball-reference.com': 1 / 3.5,
+}
+DEFAULT_RATE = 1 / 3.5
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Blocks until a token is available
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        # Tokens earned at the old rate are kept, the new rate applies from now on
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = rate
+
+
+# Buckets are shared by every Fetcher in the process, so scrapers running at the same
+# time never exceed the rate of a host between them. A rate given explicitly to a Fetcher
+# replaces the one of the host's bucket, the last one configured applies to every Fetcher
+BUCKETS = {}
+BUCKETS_LOCK = threading.Lock()
+
+def host_bucket(url, rates=None):
+    host = urlparse(url).netloc
+    rate = (rates or {}).get(host)
+    with BUCKETS_LOCK:
+        if host not in BUCKETS:
+            BUCKETS[host] = TokenBucket(rate if rate is not None else DEFAULT_RATES.get(host, DEFAULT_RATE))
+        elif rate is not None and rate != BUCKETS[host].rate:
+            BUCKETS[host].set_rate(rate)
+        return BUCKETS[host]
+
+
+class Fetcher:
+    def __init__(self, cache=None, rates=None, workers=4, ledger=None, session=None, metrics=None):
+        self.cache = cache
+        self.rates = rates
+        self.workers = workers
+        self.ledger = ledger if ledger is not None else LEDGER
+        self.session = session if session is not None else SESSION
+        self.metrics = metrics if metrics is not None else METRICS
+
+    def record(self, url, req, seconds):
+        host = urlparse(url).netloc
+        source = 'cache' if req.from_cache else 'network'
+        self.ledger.record(url, req.status_code, len(req.content), seconds, retries=getattr(req, 'retries', 0), from_cache=req.from_cache)
+        self.metrics.count('requests', host=host, source=source, status=req.status_code)
+        self.metrics.count('bytes', len(req.content), host=host, source=source)
+        if getattr(req, 'retries', 0):
+            self.metrics.count('retries', req.retries, host=host)
+        if not req.from_cache:
+            self.metrics.add('network', seconds)
+
+    def get(self, url, stale_ok=False):
+        # Cache hits don't use the rate limit budget
+        if self.cache is not None:
+            req = self.cache.cached(url, stale_ok=stale_ok)
+            if req is not None:
+                self.record(url, req, 0)
+                return req
+            if self.cache.offline:
+                raise OfflineCacheMiss(url)
+
+        # The session waits for a rate limit slot before the request and every retry of it
+        start = time.monotonic()
+        try:
+            req = fetch(url, self.cache, session=self.session, throttle=host_bucket(url, self.rates).acquire)
+        except RequestException as exc:
+            # Scrapers skip pages that are not 200, a host that stays down doesn't stop the run
+            print(f'--- Request {url} failed: {exc} ---')
+            req = CachedResponse(url, 0, b'')
+        self.record(url, req, time.monotonic() - start)
+        return req
+
+    def map(self, func, items):
+        # Runs func (which fetches through self.get and parses the page) on a pool of workers,
+        # so parsing overlaps with waiting for the next rate limit slot.
+        # Results are yielded in the order of items and at most 2 * workers are pending at a time.
+        with ThreadPoolExecutor(self.workers) as pool:
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(func, item))
+                self.metrics.gauge('queue_depth', len(pending), queue='fetch')
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,92 @@
+import re
+import lxml.html
+from pandas.io.parsers import TextParser
+
+# Same whitespace handling as pd.read_html
+WHITESPACE = re.compile(r'[\r\n]+|\s{2,}')
+
+# Parser backends understood by the scrapers. 'bs4' is the original BeautifulSoup path,
+# kept as the reference implementation, 'lxml' reads tables straight from the lxml tree.
+BACKENDS = ['lxml', 'bs4']
+
+def uncomment_tables(content):
+    # fbref and basketball reference ship many tables inside HTML comments and unhide them with javascript.
+    # Drops the markers of the comments holding a table so every parser sees them as part of the page,
+    # in a single pass over the raw bytes. Other comments are left as they are
+    text = content.encode('utf-8') if isinstance(content, str) else content
+    parts = []
+    start = 0
+    while True:
+        opening = text.find(b'<!--', start)
+        if opening < 0:
+            break
+        closing = text.find(b'-->', opening + 4)
+        if closing < 0:
+            break
+        body = text[opening + 4:closing]
+        if b'<table' in body:
+            parts.append(text[start:opening])
+            parts.append(body)
+        else:
+            parts.append(text[start:closing + 3])
+        start = closing + 3
+
+    if not parts:
+        return content
+    parts.append(text[start:])
+    text = b''.join(parts)
+    return text.decode('utf-8') if isinstance(content, str) else text
+
+def parse_html(content):
+    root = lxml.html.fromstring(content, parser=lxml.html.HTMLParser(recover=True, encoding='utf-8'))
+    for br in root.iter('br'):
+        br.tail = '\n' + (br.tail or '')
+    return root
+
+def find_table(root, table_id):
+    tables = root.xpath('//table[@id=$table_id]', table_id=table_id)
+    return tables[0] if tables else None
+
+def cell_text(cell):
+    return WHITESPACE.sub(' ', cell.text_content().strip())
+
+def row_texts(tr):
+    texts = []
+    for cell in tr.xpath('./td|./th'):
+        text = cell_text(cell)
+        texts.extend([text] * int(cell.get('colspan') or 1))
+    return texts
+
+def table_rows(table):
+    head = [tr for thead in table.xpath('.//thead') for tr in thead.xpath('./tr')]
+    body = table.xpath('.//tbody//tr') + table.xpath('./tr')
+    foot = table.xpath('.//tfoot//tr')
+
+    # Without <thead> the leading rows made only of <th> are the header
+    if not head:
+        while body and all(cell.tag == 'th' for cell in body[0].xpath('./td|./th')):
+            head.append(body.pop(0))
+
+    return [row_texts(tr) for tr in head], [row_texts(tr) for tr in body], [row_texts(tr) for tr in foot]
+
+def read_table(table):
+    # Equivalent to pd.read_html(StringIO(str(table)))[0] without serializing and parsing the table again
+    head, body, foot = table_rows(table)
+    header = None
+    rows = head + body + foot
+    if head:
+        header = 0 if len(head) == 1 else [i for i, row in enumerate(head) if any(row)]
+
+    width = max(len(row) for row in rows)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    with TextParser(rows, header=header, thousands=',') as parser:
+        return parser.read()
+
+def table_columns(table, stats, rows='./tbody/tr[not(@class)]'):
+    # Column arrays keyed by data-stat for the body rows of fbref / basketball reference tables
+    columns = {stat: [] for stat in stats}
+    for tr in table.xpath(rows):
+        cells = {cell.get('data-stat'): cell for cell in tr.xpath('./td|./th')}
+        for stat in stats:
+            columns[stat].append(cell_text(cells[stat]) if stat in cells else None)
+    return columns
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
+
+# Responses worth trying again, anything else (404 included) is returned to the scraper as it is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = (ConnectionError, Timeout, ChunkedEncodingError)
+
+
+def retry_after(response):
+    # Seconds asked by the Retry-After header, given either as a number or as a date
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    # Pauses every request to a host after consecutive failures, so the remaining queue waits
+    # for the host to recover instead of failing page after page.
+    # Once the pause is over one more failure pauses it again, for twice as long
+    def __init__(self, host, failures=5, cooldown=60, max_cooldown=15 * 60):
+        self.host = host
+        self.threshold = failures
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                remaining = self.paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return
+            print(f'--- {self.host} failed {self.failures} times in a row, pausing it for {self.cooldown:.0f}s ---')
+            self.paused_until = max(self.paused_until, time.monotonic() + self.cooldown)
+            self.failures = self.threshold - 1
+            self.cooldown = min(2 * self.cooldown, self.max_cooldown)
+
+
+class HttpSession:
+    # Pooled keep-alive connections with timeouts, retries with exponential backoff and jitter,
+    # Retry-After on 429 and a circuit breaker per host
+    def __init__(self, retries=4, backoff=2.0, max_backoff=120, timeout=(10, 30), pool_size=8,
+                 breaker_failures=5, breaker_cooldown=60):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host, self.breaker_failures, self.breaker_cooldown)
+            return self.breakers[host]
+
+    def backoff_delay(self, attempt):
+        # Exponential backoff, jittered so that workers failing together don't retry together
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def get(self, url, headers=None, throttle=None, timeout=None):
+        # throttle is called before every attempt, retries use the rate limit budget like any request.
+        # The response carries the number of retries it took, transient errors left after the last retry are raised
+        breaker = self.breaker(url)
+        for attempt in range(self.retries + 1):
+            breaker.wait()
+            if throttle is not None:
+                throttle()
+            response, error = None, None
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+            except TRANSIENT_ERRORS as exc:
+                error = exc
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                breaker.success()
+                break
+            breaker.failure()
+            if attempt == self.retries:
+                break
+
+            # 429 asks the whole host to slow down, so every worker waits for Retry-After
+            delay = retry_after(response) if response is not None and response.status_code == 429 else None
+            if delay is not None:
+                breaker.pause(delay)
+            else:
+                time.sleep(self.backoff_delay(attempt))
+
+        if response is None:
+            raise error
+        response.retries = attempt
+        return response
+
+
+# Session shared by every Fetcher in the process, so connections are reused across scrapers
+SESSION = HttpSession()
@@ -0,0 +1,51 @@
+import threading
+import time
+from collections import Counter
+import pandas as pd
+
+
+class DuplicateRequestError(Exception):
+    pass
+
+
+class RequestLedger:
+    # Records every page requested during a run
+    columns = ['url', 'status', 'bytes', 'latency', 'retries', 'from_cache', 'requested_at']
+
+    def __init__(self):
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def record(self, url, status, size, latency, retries=0, from_cache=False):
+        with self.lock:
+            self.entries.append((url, status, size, latency, retries, from_cache, time.time()))
+
+    def duplicates(self):
+        # Urls that hit the network more than once
+        with self.lock:
+            counts = Counter(entry[0] for entry in self.entries if not entry[5])
+        return {url: n for url, n in counts.items() if n > 1}
+
+    def assert_unique(self):
+        duplicates = self.duplicates()
+        if duplicates:
+            raise DuplicateRequestError(f'{len(duplicates)} urls were requested more than once: {list(duplicates)[:5]}')
+
+    def to_frame(self):
+        with self.lock:
+            return pd.DataFrame(self.entries, columns=self.columns)
+
+    def save(self, path):
+        df = self.to_frame()
+        if path.endswith('.parquet'):
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries = []
+
+
+# Ledger shared by every Fetcher in the process unless one is given explicitly
+LEDGER = RequestLedger()
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from time import perf_counter
+import pandas as pd
+
+
+class SectionTimings:
+    # Accumulated time spent in every section of the scrapers (fetch, parse, possession, lineups...),
+    # counters with labels (extractor errors, requests, bytes) and the peak of gauges like queue depths.
+    # Every event is an addition under a lock, cheap enough to leave on in every run
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.counters = defaultdict(float)
+        self.peaks = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.totals[name] += seconds
+            self.counts[name] += 1
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def gauge(self, name, value, **labels):
+        # Only the highest value is kept
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.peaks[key] = max(self.peaks.get(key, value), value)
+
+    def error(self, extractor, reason):
+        # reason is the exception raised by the extractor or a short description
+        reason = type(reason).__name__ if isinstance(reason, BaseException) else str(reason)
+        self.count('extractor_errors', extractor=extractor, reason=reason)
+
+    def errors(self):
+        with self.lock:
+            return int(sum(value for (name, labels), value in self.counters.items() if name == 'extractor_errors'))
+
+    def state(self):
+        # Plain dicts, sent back by the parse worker processes
+        with self.lock:
+            return {'totals': dict(self.totals), 'counts': dict(self.counts),
+                    'counters': dict(self.counters), 'peaks': dict(self.peaks)}
+
+    def merge(self, state):
+        # Adds the metrics recorded in another process
+        with self.lock:
+            for name, seconds in state['totals'].items():
+                self.totals[name] += seconds
+                self.counts[name] += state['counts'][name]
+            for key, value in state['counters'].items():
+                self.counters[key] += value
+            for key, value in state['peaks'].items():
+                self.peaks[key] = max(self.peaks.get(key, value), value)
+
+    def series(self):
+        # (metric, labels, value) of every metric, in the units they are exported with
+        with self.lock:
+            series = [('section_seconds_total', {'section': name}, seconds) for name, seconds in self.totals.items()]
+            series += [('section_calls_total', {'section': name}, count) for name, count in self.counts.items()]
+            series += [(name + '_total', dict(labels), value) for (name, labels), value in self.counters.items()]
+            series += [(name + '_max', dict(labels), value) for (name, labels), value in self.peaks.items()]
+        return series
+
+    def laps(self):
+        return Laps(self)
+
+    def to_frame(self):
+        with self.lock:
+            df = pd.DataFrame({'section': list(self.totals), 'calls': [self.counts[name] for name in self.totals],
+                               'total_ms': [self.totals[name] * 1000 for name in self.totals]})
+        df['mean_ms'] = df['total_ms'] / df['calls']
+        return df
+
+    def clear(self):
+        with self.lock:
+            self.totals.clear()
+            self.counts.clear()
+            self.counters.clear()
+            self.peaks.clear()
+
+
+class Laps:
+    # lap(name) records the time since the previous lap under name
+    def __init__(self, timings):
+        self.timings = timings
+        self.last = perf_counter()
+
+    def __call__(self, name):
+        now = perf_counter()
+        self.timings.add(name, now - self.last)
+        self.last = now
+
+
+# Network metrics shared by every Fetcher in the process unless one is given explicitly
+METRICS = SectionTimings()
+
+
+def prometheus_labels(labels):
+    if not labels:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+def export_metrics(path, *metrics, job='scraper'):
+    # .prom files are rewritten in the Prometheus text format (for the node exporter textfile collector),
+    # any other path gets one json line per metric appended, so runs can be compared over time
+    series = [item for m in metrics for item in m.series()]
+    if path.endswith('.prom'):
+        # Series of several objects with the same labels are added up, peaks keep the highest
+        values = {}
+        for name, labels, value in series:
+            key = (name, tuple(labels.items()))
+            values[key] = max(values.get(key, value), value) if name.endswith('_max') else values.get(key, 0) + value
+        lines = []
+        for name in dict.fromkeys(name for name, labels in values):
+            kind = 'gauge' if name.endswith('_max') else 'counter'
+            lines.append(f'# TYPE {job}_{name} {kind}')
+            lines += [f'{job}_{name}{prometheus_labels(dict(labels))} {value:g}' for (metric, labels), value in values.items() if metric == name]
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, path)
+    else:
+        now = time.time()
+        with open(path, 'a', encoding='utf-8') as f:
+            for name, labels, value in series:
+                f.write(json.dumps({'ts': now, 'job': job, 'metric': name, 'labels': labels, 'value': value}) + '\n')
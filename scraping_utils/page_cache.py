@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from scraping_utils.http_session import SESSION
+
+# Time to live (in seconds) for every page type. None means the page never expires.
+DEFAULT_TTLS = {
+    'match_report': None,
+    'boxscore': None,
+    'schedule': 12 * 3600,
+    'other': 24 * 3600,
+}
+
+# Page types are matched in order against the url
+PAGE_TYPES = [
+    ('match_report', re.compile(r'fbref\.com/+en/matches/')),
+    ('boxscore', re.compile(r'basketball-reference\.com/boxscores/')),
+    ('schedule', re.compile(r'/schedule/|_games(-[a-z0-9-]+)?\.html')),
+]
+
+def page_type(url):
+    for name, pattern in PAGE_TYPES:
+        if pattern.search(url):
+            return name
+    return 'other'
+
+
+class OfflineCacheMiss(Exception):
+    pass
+
+
+class CachedResponse:
+    # Minimal stand-in for requests.Response so scrapers can use both interchangeably
+    def __init__(self, url, status_code, content, headers=None, from_cache=False, retries=0):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.from_cache = from_cache
+        self.retries = retries
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+
+class PageCache:
+    def __init__(self, path='.page_cache', max_bytes=2 * 1024**3, ttls=None, offline=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.offline = offline
+
+        os.makedirs(os.path.join(self.path, 'blobs'), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(self.path, 'index.sqlite'), check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)')
+        self.db.commit()
+
+    def blob_path(self, digest):
+        return os.path.join(self.path, 'blobs', digest[:2], digest + '.gz')
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute('SELECT digest, etag, last_modified, fetched_at FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return {'digest': row[0], 'etag': row[1], 'last_modified': row[2], 'fetched_at': row[3]}
+
+    def is_fresh(self, url, entry):
+        ttl = self.ttls[page_type(url)]
+        return ttl is None or time.time() - entry['fetched_at'] < ttl
+
+    def read(self, url, entry):
+        with open(self.blob_path(entry['digest']), 'rb') as f:
+            content = gzip.decompress(f.read())
+        with self.lock:
+            self.db.execute('UPDATE pages SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            self.db.commit()
+        return content
+
+    def store(self, url, content, etag=None, last_modified=None):
+        # Blobs are content addressed, so identical pages under different urls are stored once
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = blob + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(gzip.compress(content))
+            os.replace(tmp, blob)
+
+        now = time.time()
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (url, digest, os.path.getsize(blob), etag, last_modified, now, now))
+            self.db.commit()
+        self.evict()
+
+    def total_bytes(self):
+        with self.lock:
+            return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM pages)').fetchone()[0]
+
+    def evict(self):
+        # Drop least recently used pages until the cache fits in max_bytes
+        total = self.total_bytes()
+        while total > self.max_bytes:
+            with self.lock:
+                row = self.db.execute('SELECT url, digest, size FROM pages ORDER BY accessed_at LIMIT 1').fetchone()
+                if row is None:
+                    return
+                url, digest, size = row
+                self.db.execute('DELETE FROM pages WHERE url = ?', (url,))
+                self.db.commit()
+                shared = self.db.execute('SELECT 1 FROM pages WHERE digest = ? LIMIT 1', (digest,)).fetchone()
+            if not shared:
+                os.remove(self.blob_path(digest))
+                total -= size
+
+    def cached(self, url, stale_ok=False):
+        # Returns the cached page if it can be used without a request, None otherwise.
+        # stale_ok uses any cached copy, for pages known not to change anymore
+        entry = self.lookup(url)
+        if entry and (self.offline or stale_ok or self.is_fresh(url, entry)):
+            return CachedResponse(url, 200, self.read(url, entry), from_cache=True)
+
+    def get(self, url, session=None, **kwargs):
+        session = session if session is not None else SESSION
+        req = self.cached(url)
+        if req is not None:
+            return req
+        entry = self.lookup(url)
+        if self.offline:
+            raise OfflineCacheMiss(url)
+
+        # Revalidate stale pages with the validators sent by the server
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        req = session.get(url, headers=headers, **kwargs)
+        if req.status_code == 304 and entry:
+            with self.lock:
+                self.db.execute('UPDATE pages SET fetched_at = ? WHERE url = ?', (time.time(), url))
+                self.db.commit()
+            return CachedResponse(url, 200, self.read(url, entry), req.headers, retries=req.retries)
+        if req.status_code == 200:
+            self.store(url, req.content, req.headers.get('ETag'), req.headers.get('Last-Modified'))
+        return CachedResponse(url, req.status_code, req.content, req.headers, retries=req.retries)
+
+
+def fetch(url, cache=None, session=None, **kwargs):
+    session = session if session is not None else SESSION
+    if cache is None:
+        req = session.get(url, **kwargs)
+        req.from_cache = False
+        return req
+    return cache.get(url, session=session, **kwargs)
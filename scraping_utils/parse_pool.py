@@ -0,0 +1,46 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from scraping_utils.metrics import SectionTimings
+
+
+def timed_parse(func, content, args):
+    # Runs in a worker process, the metrics travel back with the result
+    timings = SectionTimings()
+    result = func(content, *args, timings=timings)
+    return result, timings.state()
+
+
+class ParsePool:
+    # Parses downloaded pages in worker processes while the fetcher threads keep requesting the next ones.
+    # workers=0 parses in the calling process, workers=None uses every core.
+    def __init__(self, workers=None, timings=None):
+        self.workers = os.cpu_count() if workers is None else workers
+        self.timings = timings if timings is not None else SectionTimings()
+
+    def map(self, func, pages):
+        # pages yields (item, content, args) and func(content, *args, timings=...) parses one page.
+        # Yields (item, result) in input order, items without content get a None result
+        if self.workers == 0:
+            for item, content, args in pages:
+                yield item, None if content is None else func(content, *args, timings=self.timings)
+            return
+
+        # Bounded so a fast cache does not pile every page in memory waiting for the workers
+        max_pending = 4 * self.workers
+        with ProcessPoolExecutor(self.workers) as executor:
+            pending = deque()
+            for item, content, args in pages:
+                pending.append((item, None if content is None else executor.submit(timed_parse, func, content, args)))
+                self.timings.gauge('queue_depth', len(pending), queue='parse')
+                if len(pending) >= max_pending:
+                    yield self.collect(*pending.popleft())
+            while pending:
+                yield self.collect(*pending.popleft())
+
+    def collect(self, item, future):
+        if future is None:
+            return item, None
+        result, state = future.result()
+        self.timings.merge(state)
+        return item, result
@@ -0,0 +1,53 @@
+import json
+import os
+import threading
+import time
+import pandas as pd
+
+# Results are sometimes corrected after the game, schedules are requested again for this many days after their last game
+SETTLE_DAYS = 3
+
+def schedule_settled(dates, played, settle_days=SETTLE_DAYS, today=None):
+    # A schedule page won't change anymore once every game on it was played, settle_days ago at least
+    dates = pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce')
+    played = pd.Series(played, dtype=bool)
+    if played.empty or not played.all() or dates.isna().all():
+        return False
+    today = pd.Timestamp.now() if today is None else pd.Timestamp(today)
+    return dates.max() < today.normalize() - pd.Timedelta(days=settle_days)
+
+
+class RefreshPlanner:
+    # State of every schedule page when it was last parsed: its games, how many of them were played and the last date.
+    # Settled pages are read from their cached copy instead of being requested again, so daily runs only request
+    # the schedules with games to be played or played in the last days. Kept in a json file like the season calendar
+    def __init__(self, path=None, settle_days=SETTLE_DAYS, today=None):
+        self.path = path
+        self.settle_days = settle_days
+        self.today = today
+        self.lock = threading.Lock()
+        self.pages = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.pages = json.load(f)
+
+    def settled(self, url):
+        return self.pages.get(url, {}).get('settled', False)
+
+    def record(self, url, dates, played):
+        dates = pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce')
+        played = pd.Series(played, dtype=bool)
+        last = dates[played.values].max() if played.any() else None
+        entry = {'games': len(played), 'played': int(played.sum()), 'last_played': None if pd.isna(last) else str(last.date()),
+                 'settled': bool(schedule_settled(dates, played, self.settle_days, self.today)), 'checked_at': time.time()}
+        with self.lock:
+            self.pages[url] = entry
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.pages, f, indent=1)
+            os.replace(tmp, self.path)
@@ -0,0 +1,22 @@
+import pandas as pd
+
+NUMERIC = ['Int8', 'Int16', 'Int32', 'Int64', 'float32', 'float64']
+
+
+def convert(values, dtype):
+    # dtype is a dtype name or a pandas dtype
+    if dtype in NUMERIC:
+        # Scraped text like 'Did Not Play' or repeated header rows become missing values
+        return pd.to_numeric(values, errors='coerce').astype(dtype)
+    if dtype == 'datetime64[ns]':
+        return pd.to_datetime(values, errors='coerce')
+    return values.astype(dtype)
+
+def apply_schema(df, schema):
+    # Casts the columns of df listed in schema, other columns are left as they are.
+    # Safe to apply again, e.g. after concatenating chunks whose categories differ
+    df = df.copy()
+    for col, dtype in schema.items():
+        if col in df.columns:
+            df[col] = convert(df[col], dtype)
+    return df
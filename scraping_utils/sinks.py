@@ -0,0 +1,149 @@
+import csv
+import os
+import pandas as pd
+
+
+class CsvSink:
+    # Appends every chunk to a csv file as soon as it is parsed.
+    # The header is taken from the first chunk and later chunks are aligned to it,
+    # columns first seen in a later chunk are added to the header and left empty in the rows written before
+    def __init__(self, path, columns=None, **kwargs):
+        self.path = path
+        self.columns = columns
+        self.kwargs = kwargs
+        self.rows = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+        extra = [col for col in df.columns if col not in self.columns]
+        if extra:
+            self.columns = self.columns + extra
+            if self.rows:
+                self.widen()
+        df.reindex(columns=self.columns).to_csv(self.path, mode='a', header=self.rows == 0, index=False, **self.kwargs)
+        self.rows += len(df)
+
+    def widen(self):
+        # Rewrites the file with the current header, a row at a time so it is never loaded whole
+        sep = self.kwargs.get('sep', ',')
+        tmp = self.path + '.tmp'
+        with open(self.path, newline='', encoding='utf-8') as src, open(tmp, 'w', newline='', encoding='utf-8') as dst:
+            reader = csv.reader(src, delimiter=sep)
+            writer = csv.writer(dst, delimiter=sep, lineterminator=os.linesep)
+            next(reader)
+            writer.writerow(self.columns)
+            for row in reader:
+                writer.writerow(row + [''] * (len(self.columns) - len(row)))
+        os.replace(tmp, self.path)
+
+    def close(self):
+        # Leave a file with just the header if nothing was written
+        if self.rows == 0 and self.columns is not None:
+            pd.DataFrame(columns=self.columns).to_csv(self.path, index=False, **self.kwargs)
+
+
+def arrow_table(df):
+    import pyarrow as pa
+
+    # Scraped object columns mix numbers and text, they are stored as strings
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].map(lambda x: None if pd.isna(x) else str(x))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Columns that are empty in this chunk would get a null type, later chunks could not be cast to it
+    schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field for field in table.schema],
+                       metadata=table.schema.metadata)
+    return table.cast(schema)
+
+def write_parquet(df, path):
+    # Whole frame at once, categorical columns are kept as parquet dictionaries
+    import pyarrow.parquet as pq
+
+    pq.write_table(arrow_table(df), path)
+
+
+class ParquetSink:
+    # Writes every chunk as a row group of a single parquet file.
+    # The schema is taken from the first chunk, columns first seen in a later chunk are added to it
+    # and the row groups written before are copied to a new file with them as nulls
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = columns
+        self.writer = None
+        self.rows = 0
+
+    def write(self, df):
+        import pyarrow.parquet as pq
+
+        if self.columns is None:
+            self.columns = list(df.columns)
+        extra = [col for col in df.columns if col not in self.columns]
+        if extra:
+            self.columns = self.columns + extra
+        df = df.reindex(columns=self.columns)
+        # Every chunk has its own categories, they are written as plain strings to keep one schema
+        df = df.astype({col: object for col in df.columns[df.dtypes == 'category']})
+
+        table = arrow_table(df)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        elif extra:
+            self.widen(table)
+        self.writer.write_table(table.cast(self.writer.schema))
+        self.rows += len(df)
+
+    def widen(self, table):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # A parquet file can't be appended to once closed, the rows written so far go to a new file,
+        # a row group at a time, and the writer keeps writing to it
+        schema = self.writer.schema
+        for field in table.schema:
+            if field.name not in schema.names:
+                schema = schema.append(field)
+        written = self.writer.where
+        self.writer.close()
+        tmp = self.path + '.tmp' if written != self.path + '.tmp' else self.path + '.tmp2'
+        writer = pq.ParquetWriter(tmp, schema)
+        groups = pq.ParquetFile(written)
+        for i in range(groups.num_row_groups):
+            group = groups.read_row_group(i)
+            for field in schema:
+                if field.name not in group.schema.names:
+                    group = group.append_column(field, pa.nulls(len(group), field.type))
+            writer.write_table(group.cast(schema))
+        groups.close()
+        if written != self.path:
+            os.remove(written)
+        self.writer = writer
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            if self.writer.where != self.path:
+                os.replace(self.writer.where, self.path)
+
+
+class TeeSink:
+    # Writes every chunk to several sinks, like csv and parquet copies of the same output
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, df):
+        for sink in self.sinks:
+            sink.write(df)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def open_sink(path, **kwargs):
+    if path.endswith('.parquet'):
+        return ParquetSink(path, **kwargs)
+    return CsvSink(path, **kwargs)
@@ -0,0 +1,135 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import pandas as pd
+
+# Tables of the scraped data, their primary key and the indexes of the columns queries filter by.
+# NBA games are keyed by date and home team because games not played yet have no box score url,
+# the row of a game is updated when its box score comes out
+TABLES = {
+    'fbref_games': {'key': ['Match Report'],
+                    'indexes': [['league', 'season'], ['season'], ['Home', 'season'], ['Away', 'season'], ['Date']]},
+    'fbref_match_players': {'key': ['match_id', 'side', 'role', 'slot'], 'indexes': [['name']]},
+    'nba_games': {'key': ['date', 'home_code'],
+                  'indexes': [['season'], ['home_code', 'season'], ['away_code', 'season'], ['boxscore']]},
+    'nba_players': {'key': ['boxscore', 'player'],
+                    'indexes': [['season'], ['home_code', 'season'], ['away_code', 'season'], ['team', 'season'], ['date'], ['player_url']]},
+}
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+def sql_names(columns):
+    # SQLite column names are case insensitive, a name clashing with an earlier one gets a suffix
+    # (PTS_team of the box score totals next to pts_team of the games becomes PTS_team_2)
+    seen = set()
+    names = []
+    for col in columns:
+        name, n = col, 1
+        while name.lower() in seen:
+            n += 1
+            name = f'{col}_{n}'
+        seen.add(name.lower())
+        names.append(name)
+    return names
+
+def sql_values(series):
+    # Python values sqlite3 can bind, dates as ISO text and missing values as NULL
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+    elif series.dtype == 'float32':
+        # Through their shortest repr, 0.929 is stored as 0.929 instead of 0.9290000200271606
+        series = series.astype(str).astype('float64')
+    return [None if pd.isna(value) else value for value in series.tolist()]
+
+
+class SqliteStore:
+    # Embedded database with the scraped games and player logs, rows are upserted by the key of their table.
+    # Every row keeps a hash of its values so writing the same rows again changes nothing on disk
+    def __init__(self, path, tables=None):
+        self.path = path
+        self.tables = {**TABLES, **(tables or {})}
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+
+    def columns(self, table):
+        return [row[1] for row in self.db.execute(f'PRAGMA table_info({quote(table)})')]
+
+    def prepare(self, table, df):
+        # Creates the table with the columns of the first frame, later frames can add columns
+        spec = self.tables[table]
+        existing = self.columns(table)
+        if not existing:
+            columns = [f'{quote(col)} {sql_type(df[col].dtype)}' for col in df.columns] + ['"_hash" TEXT NOT NULL']
+            key = ', '.join(quote(col) for col in spec['key'])
+            self.db.execute(f'CREATE TABLE {quote(table)} ({", ".join(columns)}, PRIMARY KEY ({key}))')
+            existing = list(df.columns)
+        existing = {col.lower() for col in existing}
+        for col in df.columns:
+            if col.lower() not in existing:
+                self.db.execute(f'ALTER TABLE {quote(table)} ADD COLUMN {quote(col)} {sql_type(df[col].dtype)}')
+                existing.add(col.lower())
+        for index in spec['indexes']:
+            if all(col.lower() in existing for col in index):
+                name = re.sub(r'\W', '_', f'{table}_{"_".join(index)}')
+                self.db.execute(f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({", ".join(quote(col) for col in index)})')
+
+    def upsert(self, table, df):
+        # Inserts the new rows and updates the ones whose values changed, returns how many were written.
+        # Rows without a full key are left out, of rows with the same key the last one is kept
+        key = self.tables[table]['key']
+        df = df.loc[:, ~df.columns.duplicated()]
+        df = df.set_axis(sql_names(df.columns), axis=1)
+        missing = df[key].isna().any(axis=1)
+        if missing.any():
+            print(f'--- {int(missing.sum())} rows without {key} were not stored in {table} ---')
+            df = df[~missing]
+        df = df.drop_duplicates(subset=key, keep='last')
+        if df.empty:
+            return 0
+
+        columns = list(df.columns)
+        rows = list(zip(*[sql_values(df[col]) for col in columns]))
+        hashes = [hashlib.sha1(repr((columns, row)).encode('utf-8')).hexdigest() for row in rows]
+
+        names = ', '.join(quote(col) for col in columns + ['_hash'])
+        updates = ', '.join(f'{quote(col)} = excluded.{quote(col)}' for col in columns + ['_hash'] if col not in key)
+        sql = (f'INSERT INTO {quote(table)} ({names}) VALUES ({", ".join("?" * (len(columns) + 1))}) '
+               f'ON CONFLICT ({", ".join(quote(col) for col in key)}) DO UPDATE SET {updates} '
+               f'WHERE {quote(table)}."_hash" IS NOT excluded."_hash"')
+        with self.lock:
+            self.prepare(table, df)
+            before = self.db.total_changes
+            self.db.executemany(sql, [row + (row_hash,) for row, row_hash in zip(rows, hashes)])
+            self.db.commit()
+            return self.db.total_changes - before
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return pd.read_sql_query(sql, self.db, params=params)
+
+    def close(self):
+        self.db.close()
+
+
+class StoreSink:
+    # Upserts every chunk into a table of the store as soon as it is parsed, like the file sinks
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+        self.rows = 0
+
+    def write(self, df):
+        self.rows += self.store.upsert(self.table, df)
+
+    def close(self):
+        pass
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import socket
+import sqlite3
+import threading
+import time
+import pandas as pd
+
+# Client errors other than 429 won't go away by asking again
+PERMANENT_STATUSES = {400, 401, 403, 404, 410}
+
+
+def shard_of(key, shards):
+    # Stable across processes and machines, unlike hash()
+    return int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) % shards
+
+
+class WorkQueue:
+    # Persistent queue of pages to scrape, in a SQLite file.
+    # Every task is a url with the arguments its parser needs, and belongs to one shard so several
+    # workers (on one machine sharing the file, or on several machines with a copy each) split the work.
+    # Claimed tasks are leased, the tasks of a worker that died are claimed again once the lease expires
+    def __init__(self, path, lease=3600, max_attempts=3):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS tasks (
+            url TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            args TEXT NOT NULL,
+            shard INTEGER NOT NULL,
+            stage INTEGER NOT NULL,
+            parent TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            claimed_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            result TEXT,
+            finished_at REAL
+        )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, shard, stage)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.db.commit()
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, json.dumps(value)))
+            self.db.commit()
+
+    def add(self, tasks, shard=None, stage=0, parent=None):
+        # tasks are (kind, url, args). Urls already queued are left as they are, so planning twice is harmless.
+        # Without shard every task gets the shard of its url
+        shards = self.get_meta('shards', 1)
+        rows = [(url, kind, json.dumps(args, default=str), shard_of(url, shards) if shard is None else shard, stage, parent)
+                for kind, url, args in tasks]
+        with self.lock:
+            cursor = self.db.executemany('INSERT OR IGNORE INTO tasks (url, kind, args, shard, stage, parent) VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self.db.commit()
+        return cursor.rowcount
+
+    def claim(self, worker=None, shard=None, limit=50):
+        # Earlier stages first, they add the tasks of the later ones.
+        # An expired lease counts as a failed attempt, so a task that keeps killing its worker ends up failed
+        worker = worker or socket.gethostname()
+        now = time.time()
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                self.db.execute('''UPDATE tasks SET attempts = attempts + 1, status = 'pending', worker = NULL, error = 'lease expired'
+                    WHERE status = 'claimed' AND claimed_at < ? AND (? IS NULL OR shard = ?)''', (now - self.lease, shard, shard))
+                self.db.execute('''UPDATE tasks SET status = 'failed', finished_at = ?
+                    WHERE status = 'pending' AND attempts >= ? AND (? IS NULL OR shard = ?)''', (now, self.max_attempts, shard, shard))
+                rows = self.db.execute('''SELECT url, kind, args, shard, stage FROM tasks
+                    WHERE status = 'pending' AND (? IS NULL OR shard = ?)
+                    ORDER BY stage, rowid LIMIT ?''', (shard, shard, limit)).fetchall()
+                self.db.executemany("UPDATE tasks SET status = 'claimed', worker = ?, claimed_at = ? WHERE url = ?",
+                                    [(worker, now, row[0]) for row in rows])
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+        return [{'url': url, 'kind': kind, 'args': json.loads(args), 'shard': task_shard, 'stage': stage}
+                for url, kind, args, task_shard, stage in rows]
+
+    def complete(self, url, result):
+        with self.lock:
+            self.db.execute("UPDATE tasks SET status = 'done', result = ?, error = NULL, finished_at = ? WHERE url = ?",
+                            (json.dumps(result, default=str), time.time(), url))
+            self.db.commit()
+
+    def fail(self, url, error, status=None):
+        # Tasks are tried again up to max_attempts times, pages that don't exist are given up at once
+        with self.lock:
+            attempts = self.db.execute('SELECT attempts FROM tasks WHERE url = ?', (url,)).fetchone()[0] + 1
+            final = attempts >= self.max_attempts or status in PERMANENT_STATUSES
+            self.db.execute('UPDATE tasks SET status = ?, attempts = ?, error = ?, finished_at = ? WHERE url = ?',
+                            ('failed' if final else 'pending', attempts, str(error), time.time(), url))
+            self.db.commit()
+
+    def release(self, worker):
+        # Gives back the tasks a worker claimed and didn't finish, e.g. when it is stopped
+        with self.lock:
+            self.db.execute("UPDATE tasks SET status = 'pending', worker = NULL WHERE status = 'claimed' AND worker = ?", (worker,))
+            self.db.commit()
+
+    def results(self, kind):
+        # (url, args, result) of the finished tasks of a kind
+        with self.lock:
+            rows = self.db.execute("SELECT url, args, result FROM tasks WHERE kind = ? AND status = 'done'", (kind,)).fetchall()
+        return [(url, json.loads(args), json.loads(result)) for url, args, result in rows]
+
+    def progress(self):
+        with self.lock:
+            rows = self.db.execute('SELECT shard, kind, status, COUNT(*) FROM tasks GROUP BY shard, kind, status').fetchall()
+        df = pd.DataFrame(rows, columns=['shard', 'kind', 'status', 'tasks'])
+        return df.pivot_table(index=['shard', 'kind'], columns='status', values='tasks', fill_value=0)
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The scrapers import their neighbouring modules directly, like when they are run as scripts
+for path in (ROOT, os.path.join(ROOT, 'nba_scraper'), os.path.join(ROOT, 'football_scraper')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+from scraping_utils.page_cache import CachedResponse
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+NBA = 'https://www.basketball-reference.com'
+
+
+def fixture_text(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class FixtureFetcher:
+    # Serves the fixture pages by url, in place of the Fetcher of the scrapers
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url, stale_ok=False):
+        self.requested.append(url)
+        if url not in self.pages:
+            return CachedResponse(url, 404, b'')
+        return CachedResponse(url, 200, fixture_text(self.pages[url]).encode('utf-8'))
+
+    def map(self, func, items):
+        return map(func, items)
+
+
+def fbref_fetcher():
+    # Schedule of the fixture competition, every played match links to the fixture report
+    from Scraper_FBREF import comp_schedule_url
+    pages = {comp_schedule_url('Copa Libertadores', 2022): 'fbref_schedule.html'}
+    for i, teams in enumerate(['Team0a-Team0b', 'Team1a-Team1b', 'Team2a-Team2b', 'Team3a-Team3b']):
+        pages[f'https://fbref.com//en/matches/abc{i:03d}/{teams}'] = 'fbref_match_report.html'
+    return FixtureFetcher(pages)
+
+
+def nba_fetcher():
+    pages = {f'{NBA}/leagues/NBA_2023_games.html': 'nba_2023_games-october.html'}
+    for month in ['october', 'november']:
+        pages[f'{NBA}/leagues/NBA_2023_games-{month}.html'] = f'nba_2023_games-{month}.html'
+    for boxscore in ['202210180BOS', '202210180GSW', '202211020NYK']:
+        pages[f'{NBA}/boxscores/{boxscore}.html'] = f'nba_boxscore_{boxscore}.html'
+    return FixtureFetcher(pages)
+
+
+class StubServer:
+    # Local http server answering every path with the responses queued for it, in order.
+    # The last response of a path keeps being served once its queue is down to one
+    def __init__(self):
+        self.responses = defaultdict(deque)
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests.append(self.path)
+                    queue = stub.responses[self.path]
+                    status, headers, body = queue.popleft() if len(queue) > 1 else (queue[0] if queue else (404, {}, b''))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server.server_port}{path}'
+
+    def add(self, path, status=200, body=b'', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self.lock:
+            self.responses[path].append((status, headers or {}, body))
+        return self.url(path)
+
+    def hits(self, path):
+        with self.lock:
+            return self.requests.count(path)
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
@@ -0,0 +1,36 @@
+import pytest
+import Scraper_FBREF
+from conftest import fixture_text
+from Scraper_FBREF import FBREFScraper
+from scraping_utils.artifact_cache import ArtifactCache
+from scraping_utils.metrics import SectionTimings
+
+URL = 'https://fbref.com/en/matches/abc000/'
+
+
+@pytest.mark.parametrize('stats', [None, ['possession', 'lineups'], ['shots_ongoal']])
+def test_match_report_hits_skip_parsing(tmp_path, monkeypatch, stats):
+    content = fixture_text('fbref_match_report.html').encode('utf-8')
+    artifacts = ArtifactCache(str(tmp_path))
+    expected = FBREFScraper.parse_stats(content, URL, stats=stats)
+
+    # The first parse of the report stores the record of every stat, whichever were asked for
+    FBREFScraper.parse_stats(content, URL, artifacts=artifacts)
+
+    def no_parsing(*args, **kwargs):
+        raise AssertionError('the page was parsed again')
+    monkeypatch.setattr(Scraper_FBREF, 'BeautifulSoup', no_parsing)
+    timings = SectionTimings()
+    record = FBREFScraper.parse_stats(content, URL, stats=stats, artifacts=artifacts, timings=timings)
+
+    assert record == expected
+    assert 'parse' not in timings.to_frame()['section'].tolist()
+
+
+def test_match_report_miss_returns_the_stats_asked_for(tmp_path):
+    content = fixture_text('fbref_match_report.html').encode('utf-8')
+
+    record = FBREFScraper.parse_stats(content, URL, stats=['possession'], artifacts=ArtifactCache(str(tmp_path)))
+
+    assert record == FBREFScraper.parse_stats(content, URL, stats=['possession'])
+    assert record['extracted'] == ['possession']
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+from scraping_utils.page_cache import CachedResponse
+from conftest import FixtureFetcher, fixture_text, nba_fetcher
+from games_scraper import GamesScraper
+from players_scraper import PlayerLogScraper
+from season_calendar import SeasonCalendar
+from Scraper_FBREF import FBREFScraper, comp_schedule_url, match_id
+
+
+def test_fbref_schedule():
+    url = comp_schedule_url('Copa Libertadores', 2022)
+    games = {}
+    for backend in ['lxml', 'bs4']:
+        scraper = FBREFScraper([2022], ['Copa Libertadores'], fetcher=FixtureFetcher({url: 'fbref_schedule.html'}), backend=backend)
+        games[backend] = scraper.get_comp_games('Copa Libertadores', 2022)
+
+    # Spacer and repeated header rows are dropped, the last fixture is still to be played
+    assert len(games['lxml']) == 5
+    assert games['lxml']['HomeGoals'].isna().tolist() == [False] * 4 + [True]
+    assert games['lxml']['Match Report'].map(match_id).tolist() == [f'abc{i:03d}' for i in range(5)]
+    pd.testing.assert_frame_equal(games['lxml'], games['bs4'])
+
+
+def test_fbref_match_report():
+    content = fixture_text('fbref_match_report.html').encode('utf-8')
+    records = {backend: FBREFScraper.parse_stats(content, 'https://fbref.com/en/matches/abc000/', backend) for backend in ['lxml', 'bs4']}
+
+    # The keeper stats are commented out in the page
+    assert records['lxml']['shots_ongoal_home'] is not None
+    assert records['lxml']['formation_home'] == '4-2-3-1'
+    assert len(records['lxml']['players']) > 22
+    assert records['lxml'] == records['bs4']
+
+
+def test_fbref_match_report_without_lineups():
+    # Without the lineups, subs are told apart by the indentation of their cell in the player stats tables
+    content = fixture_text('fbref_match_report.html').replace('class="lineup"', 'class="no_lineup"').encode('utf-8')
+    records = {backend: FBREFScraper.parse_stats(content, 'https://fbref.com/en/matches/abc000/', backend, stats=['lineups']) for backend in ['lxml', 'bs4']}
+
+    bench = [player['name'] for player in records['lxml']['players'] if player['role'] == 'bench']
+    assert bench == ['Ph13', 'Ph12', 'Ph11', 'Pa13', 'Pa12', 'Pa11']
+    assert records['lxml'] == records['bs4']
+
+
+@pytest.mark.parametrize('month', ['october', 'november'])
+def test_nba_month(month):
+    games = {backend: GamesScraper(2023, fetcher=nba_fetcher(), backend=backend).get_games(month) for backend in ['lxml', 'bs4']}
+
+    assert games['lxml']['boxscore'].notna().sum() == {'october': 2, 'november': 1}[month]
+    pd.testing.assert_frame_equal(games['lxml'], games['bs4'])
+
+
+@pytest.mark.parametrize('backend', ['lxml', 'bs4'])
+def test_nba_month_links_from_schedule(backend):
+    # Box score links are read from the schedule table, not from whichever table comes first in the page
+    standings = '<table id="standings"><tbody><tr><td data-stat="box_score_text"><a href="/boxscores/other.html">Box Score</a></td></tr></tbody></table>\n'
+    page = fixture_text('nba_2023_games-november.html').replace('<div id="all_schedule">', standings + '<div id="all_schedule">')
+    fetcher = FixtureFetcher({})
+    fetcher.get = lambda url, stale_ok=False: CachedResponse(url, 200, page.encode('utf-8'))
+
+    games = GamesScraper(2023, fetcher=fetcher, backend=backend).get_games('november')
+
+    assert games['boxscore'].tolist()[0] == 'https://www.basketball-reference.com/boxscores/202211020NYK.html'
+    assert pd.isna(games['boxscore'].tolist()[1])
+
+
+def test_nba_players():
+    players = {}
+    for backend in ['lxml', 'bs4']:
+        fetcher = nba_fetcher()
+        games = pd.concat(list(GamesScraper(2023, fetcher=fetcher, backend=backend, calendar=SeasonCalendar()).iter_games()), ignore_index=True)
+        scraper = PlayerLogScraper(games, fetcher=fetcher, backend=backend)
+        scraper.run()
+        players[backend] = scraper.players
+
+    # 7 players a team in each of the 3 games played, the one who did not play has no stats
+    assert len(players['lxml']) == 42
+    assert players['lxml']['player_url'].notna().all()
+    assert players['lxml']['PTS'].isna().sum() == 6
+    # The bs4 parser merges the basic and advanced tables by name, which sorts the players
+    order = ['boxscore', 'team', 'player']
+    lxml = players['lxml'].sort_values(order).reset_index(drop=True)
+    bs4 = players['bs4'].sort_values(order).reset_index(drop=True)
+    pd.testing.assert_frame_equal(lxml, bs4[lxml.columns])
@@ -0,0 +1,12 @@
+from conftest import fbref_fetcher
+from batch_scraper import BatchWorker
+
+
+def test_fbref_schedule_queues_played_reports():
+    worker = BatchWorker(None, {'fbref': {'leagues': ['Copa Libertadores'], 'seasons': [2022]}}, fbref_fetcher())
+
+    games, pages = worker.fbref_schedule({'args': {'league': 'Copa Libertadores', 'season': 2022}})
+
+    # Shootouts are played matches, only the fixture still to be played has no report to request
+    assert len(games) == 5
+    assert [url for kind, url, args in pages] == [f'https://fbref.com//en/matches/abc{i:03d}/Team{i}a-Team{i}b' for i in range(4)]
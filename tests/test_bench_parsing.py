@@ -0,0 +1,18 @@
+import os
+import sys
+from conftest import ROOT
+
+sys.path.append(os.path.join(ROOT, 'benchmarks'))
+from bench_parsing import KINDS, bench_kind, load_corpus
+
+
+def test_sample_corpus():
+    # The corpus shipped with the benchmark has pages of every kind, all of them parsed
+    manifest, pages = load_corpus(os.path.join(ROOT, 'benchmarks', 'corpus'))
+
+    assert set(manifest['kind']) == set(KINDS)
+    assert len(pages) == len(manifest)
+    for kind in KINDS:
+        result = bench_kind(kind, manifest, pages, 'lxml', repeat=1)
+        assert result['pages'] == (manifest['kind'] == kind).sum()
+        assert 'fetch' in result['sections_ms'] and len(result['sections_ms']) > 1
@@ -0,0 +1,71 @@
+import pandas as pd
+from conftest import fbref_fetcher, nba_fetcher
+from games_scraper import GamesScraper
+from players_scraper import PlayerLogScraper
+from season_calendar import SeasonCalendar
+from Scraper_FBREF import FBREFScraper
+from scraping_utils.checkpoint import CheckpointStore
+
+
+def test_index_keeps_offsets_of_latest_entries(tmp_path):
+    checkpoint = CheckpointStore(str(tmp_path / 'checkpoint.jsonl'))
+    checkpoint.append('a', [{'x': 1}])
+    checkpoint.append('b', [{'x': 2, 'extracted': ['lineups']}], date='2022-10-18')
+    checkpoint.append('a', [{'x': 3}])
+    # Line cut short by a run that was killed while writing
+    with open(checkpoint.path, 'a', encoding='utf-8') as f:
+        f.write('{"url": "c", "rows": [')
+
+    done = checkpoint.load()
+
+    assert sorted(done) == ['a', 'b']
+    assert all(isinstance(offset, int) for offset in done.values())
+    assert done.rows('a') == [{'x': 3}]
+    assert done.rows('b') == [{'x': 2, 'extracted': ['lineups']}]
+    assert list(checkpoint.load(lambda entry: 'extracted' in entry['rows'][0])) == ['b']
+    assert checkpoint.latest() == pd.Timestamp('2022-10-18')
+
+
+def test_resumed_run_replays_stored_games(tmp_path):
+    fetcher = nba_fetcher()
+    games = pd.concat(list(GamesScraper(2023, fetcher=fetcher, calendar=SeasonCalendar()).iter_games()), ignore_index=True)
+    checkpoint = CheckpointStore(str(tmp_path / 'players_checkpoint.jsonl'))
+    first = PlayerLogScraper(games, fetcher=fetcher, checkpoint=checkpoint)
+    first.run()
+
+    # Every game is in the checkpoint, the resumed run requests no box score
+    fetcher.requested = []
+    resumed = PlayerLogScraper(games, fetcher=fetcher, checkpoint=checkpoint)
+    chunks = list(resumed.iter_player_rows())
+
+    assert fetcher.requested == []
+    assert len(chunks) == 3
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True).astype(str), first.players.astype(str))
+
+
+def test_resumed_fbref_run_replays_stored_reports(tmp_path):
+    fetcher = fbref_fetcher()
+    checkpoint = CheckpointStore(str(tmp_path / 'games_checkpoint.jsonl'))
+    first = FBREFScraper([2022], ['Copa Libertadores'], fetcher=fetcher, checkpoint=checkpoint)
+    first.run()
+
+    # The schedule is requested again, the stored reports are not
+    fetcher.requested = []
+    resumed = FBREFScraper([2022], ['Copa Libertadores'], fetcher=fetcher, checkpoint=checkpoint)
+    resumed.run()
+    assert len(fetcher.requested) == 1
+    pd.testing.assert_frame_equal(resumed.games, first.games)
+
+
+def test_reports_with_fewer_stats_are_scraped_again(tmp_path):
+    fetcher = fbref_fetcher()
+    checkpoint = CheckpointStore(str(tmp_path / 'games_checkpoint.jsonl'))
+    FBREFScraper([2022], ['Copa Libertadores'], fetcher=fetcher, checkpoint=checkpoint, stats=['possession']).run()
+
+    fetcher.requested = []
+    FBREFScraper([2022], ['Copa Libertadores'], fetcher=fetcher, checkpoint=checkpoint).run()
+    assert len(fetcher.requested) == 5
+
+    fetcher.requested = []
+    FBREFScraper([2022], ['Copa Libertadores'], fetcher=fetcher, checkpoint=checkpoint, stats=['possession']).run()
+    assert len(fetcher.requested) == 1
@@ -0,0 +1,22 @@
+from scraping_utils import fetcher as fetcher_module
+from scraping_utils.fetcher import DEFAULT_RATES, host_bucket
+
+URL = 'https://www.basketball-reference.com/leagues/NBA_2023_games.html'
+HOST = 'www.basketball-reference.com'
+
+
+def test_buckets_are_shared_between_fetchers(monkeypatch):
+    monkeypatch.setattr(fetcher_module, 'BUCKETS', {})
+    bucket = host_bucket(URL)
+    assert bucket.rate == DEFAULT_RATES[HOST]
+    assert host_bucket(URL.replace('games', 'games-november')) is bucket
+
+
+def test_configured_rate_replaces_the_one_of_the_bucket(monkeypatch):
+    monkeypatch.setattr(fetcher_module, 'BUCKETS', {})
+    bucket = host_bucket(URL)
+    assert host_bucket(URL, {HOST: 1000}) is bucket
+    assert bucket.rate == 1000
+    # Fetchers without a rate for the host keep the configured one
+    host_bucket(URL, {'fbref.com': 1})
+    assert bucket.rate == 1000
@@ -0,0 +1,41 @@
+import pandas as pd
+from conftest import NBA, fixture_text, nba_fetcher
+from gamelog_scraper import GamelogScraper
+from games_scraper import GamesScraper
+from players_scraper import PlayerLogScraper
+from season_calendar import SeasonCalendar
+
+GAMELOG = f'{NBA}/players/b/bosplayer00/gamelog/2023'
+
+
+def season_players():
+    fetcher = nba_fetcher()
+    games = pd.concat(list(GamesScraper(2023, fetcher=fetcher, calendar=SeasonCalendar()).iter_games()), ignore_index=True)
+    scraper = PlayerLogScraper(games, fetcher=fetcher)
+    scraper.run()
+    return scraper.players
+
+
+def test_backfill():
+    players = season_players()
+    # A stat the box score of the player is missing
+    first_game = (players['player_url'] == GAMELOG) & (players['boxscore'] == f'{NBA}/boxscores/202210180BOS.html')
+    players.loc[first_game, 'PTS'] = pd.NA
+    gamelogs = GamelogScraper.parse_gamelog(fixture_text('nba_gamelog_bosplayer00_2023.html').encode('utf-8'), GAMELOG)
+
+    backfilled = GamelogScraper(players).backfill(players, gamelogs=gamelogs)
+
+    assert len(backfilled) == len(players) + 2
+    assert not backfilled.duplicated(['boxscore', 'player']).any()
+    player = backfilled[backfilled['player_url'] == GAMELOG].set_index('boxscore')
+    assert player.loc[f'{NBA}/boxscores/202210180BOS.html', 'PTS'] == 8
+
+    # Games only in the gamelog get the player, season and teams of their row
+    added = player.loc[[f'{NBA}/boxscores/202210210MIA.html', f'{NBA}/boxscores/202210240BOS.html']]
+    assert (added['player'] == 'Celtics Player 0').all()
+    assert (added['season'] == 2023).all()
+    assert (added['team'] == 'Boston Celtics').all()
+    assert added['rival'].tolist() == ['Miami Heat', 'New York Knicks']
+    assert added['home_code'].tolist() == ['MIA', 'BOS']
+    assert added['away_code'].tolist() == ['BOS', 'NYK']
+    assert added['MP'].tolist() == ['30:12', 'Inactive']
@@ -0,0 +1,130 @@
+import pytest
+from scraping_utils import http_session
+from scraping_utils.http_session import CircuitBreaker, HttpSession, retry_after
+
+
+class Clock:
+    # Stands in for time.monotonic and time.sleep, sleeping only moves the clock forward
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_session.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(http_session.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_retries_503_until_success(stub_server, clock):
+    url = stub_server.add('/page', 503)
+    stub_server.add('/page', 503)
+    stub_server.add('/page', 200, 'ok')
+
+    response = HttpSession(retries=4, backoff=1.0).get(url)
+
+    assert response.status_code == 200
+    assert response.text == 'ok'
+    assert response.retries == 2
+    assert stub_server.hits('/page') == 3
+    # Jittered exponential backoff, between half and all of 1s then 2s
+    assert len(clock.sleeps) == 2
+    assert 0.5 <= clock.sleeps[0] <= 1.0
+    assert 1.0 <= clock.sleeps[1] <= 2.0
+
+
+def test_returns_last_response_after_retries(stub_server, clock):
+    url = stub_server.add('/down', 503)
+
+    response = HttpSession(retries=2, breaker_failures=10).get(url)
+
+    assert response.status_code == 503
+    assert response.retries == 2
+    assert stub_server.hits('/down') == 3
+
+
+def test_404_is_not_retried(stub_server, clock):
+    url = stub_server.add('/missing', 404)
+
+    response = HttpSession().get(url)
+
+    assert response.status_code == 404
+    assert response.retries == 0
+    assert stub_server.hits('/missing') == 1
+    assert clock.sleeps == []
+
+
+def test_429_waits_for_retry_after(stub_server, clock):
+    url = stub_server.add('/limited', 429, headers={'Retry-After': '7'})
+    stub_server.add('/limited', 200, 'ok')
+    session = HttpSession(backoff=30)
+
+    response = session.get(url)
+
+    # Retry-After pauses the whole host and replaces the backoff, which would have waited at least 15s
+    assert response.status_code == 200
+    assert response.retries == 1
+    assert clock.sleeps == [7.0]
+    assert session.breaker(url).paused_until == 1007.0
+
+
+def test_retry_after_formats():
+    class Response:
+        def __init__(self, value):
+            self.headers = {'Retry-After': value} if value is not None else {}
+
+    assert retry_after(Response('12')) == 12.0
+    assert retry_after(Response(None)) is None
+    assert retry_after(Response('soon')) is None
+    assert retry_after(Response('Wed, 21 Oct 2015 07:28:00 GMT')) == 0.0
+
+
+def test_breaker_pauses_then_doubles(clock):
+    breaker = CircuitBreaker('host', failures=3, cooldown=10, max_cooldown=25)
+
+    breaker.failure()
+    breaker.failure()
+    assert breaker.paused_until == 0.0
+    breaker.failure()
+    assert breaker.paused_until == 1010.0
+
+    # One more failure after the pause pauses the host for twice as long, up to max_cooldown
+    clock.now = 1010.0
+    breaker.failure()
+    assert breaker.paused_until == 1030.0
+    clock.now = 1030.0
+    breaker.failure()
+    assert breaker.paused_until == 1055.0
+
+    # A success resets the count and the cooldown
+    breaker.success()
+    clock.now = 1100.0
+    breaker.failure()
+    breaker.failure()
+    assert breaker.paused_until == 1055.0
+    breaker.failure()
+    assert breaker.paused_until == 1110.0
+
+
+def test_breaker_pauses_the_session(stub_server, clock):
+    url = stub_server.add('/flaky', 503)
+    session = HttpSession(retries=3, backoff=0, breaker_failures=2, breaker_cooldown=5)
+    breaker = session.breaker(url)
+
+    session.get(url)
+
+    # 4 failures with a threshold of 2: the host is paused 5s after the 2nd and 10s after the 3rd,
+    # the requests waited for both pauses. The 4th is the last attempt and leaves a 20s pause
+    assert stub_server.hits('/flaky') == 4
+    assert [wait for wait in clock.sleeps if wait] == [5.0, 10.0]
+    assert breaker.cooldown == 40
+    assert breaker.paused_until == clock.now + 20
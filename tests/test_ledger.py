@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from scraping_utils.fetcher import Fetcher
+from scraping_utils.http_session import HttpSession
+from scraping_utils.ledger import DuplicateRequestError, RequestLedger
+from scraping_utils.page_cache import PageCache
+from conftest import fixture_text
+from games_scraper import GamesScraper
+from players_scraper import PlayerLogScraper
+from season_calendar import SeasonCalendar
+
+SITE = 'https://www.basketball-reference.com'
+BOXSCORES = ['202210180BOS', '202210180GSW', '202211020NYK']
+
+
+@pytest.fixture
+def site(stub_server, monkeypatch):
+    # Basketball Reference pages served by the stub server, the scrapers keep requesting the real urls
+    stub_server.add('/leagues/NBA_2023_games.html', body=fixture_text('nba_2023_games-october.html'))
+    for month in ['october', 'november']:
+        stub_server.add(f'/leagues/NBA_2023_games-{month}.html', body=fixture_text(f'nba_2023_games-{month}.html'))
+    for boxscore in BOXSCORES:
+        stub_server.add(f'/boxscores/{boxscore}.html', body=fixture_text(f'nba_boxscore_{boxscore}.html'))
+
+    session = HttpSession(retries=0)
+    get = session.session.get
+    monkeypatch.setattr(session.session, 'get', lambda url, **kwargs: get(url.replace(SITE, stub_server.url('')), **kwargs))
+    return stub_server, session
+
+
+def scrape(fetcher):
+    games = pd.concat(list(GamesScraper(2023, fetcher=fetcher, calendar=SeasonCalendar()).iter_games()), ignore_index=True)
+    scraper = PlayerLogScraper(games, fetcher=fetcher)
+    scraper.run()
+    return games, scraper.players
+
+
+def test_scrape_requests_every_page_once(site):
+    stub_server, session = site
+    ledger = RequestLedger()
+    fetcher = Fetcher(rates={'www.basketball-reference.com': 1000}, ledger=ledger, session=session)
+
+    games, players = scrape(fetcher)
+
+    assert len(games) == 4
+    assert players['boxscore'].nunique() == 3
+    ledger.assert_unique()
+    # Season index, 2 months and the box scores of the 3 games played
+    frame = ledger.to_frame()
+    assert len(frame) == 6
+    assert (frame['status'] == 200).all()
+    assert not frame['from_cache'].any()
+    assert all(stub_server.hits(f'/boxscores/{boxscore}.html') == 1 for boxscore in BOXSCORES)
+
+
+def test_assert_unique_catches_repeated_requests(site):
+    stub_server, session = site
+    ledger = RequestLedger()
+    fetcher = Fetcher(rates={'www.basketball-reference.com': 1000}, ledger=ledger, session=session)
+
+    scrape(fetcher)
+    scrape(fetcher)
+
+    assert set(ledger.duplicates()) == {SITE + f'/boxscores/{boxscore}.html' for boxscore in BOXSCORES} | {
+        SITE + '/leagues/NBA_2023_games.html', SITE + '/leagues/NBA_2023_games-october.html', SITE + '/leagues/NBA_2023_games-november.html'}
+    with pytest.raises(DuplicateRequestError):
+        ledger.assert_unique()
+
+
+def test_cached_pages_are_not_duplicates(site, tmp_path):
+    stub_server, session = site
+    ledger = RequestLedger()
+    fetcher = Fetcher(cache=PageCache(path=str(tmp_path)), rates={'www.basketball-reference.com': 1000}, ledger=ledger, session=session)
+
+    scrape(fetcher)
+    scrape(fetcher)
+
+    ledger.assert_unique()
+    assert ledger.to_frame()['from_cache'].sum() > 0
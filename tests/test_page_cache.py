@@ -0,0 +1,84 @@
+import os
+import pytest
+from scraping_utils import page_cache
+from scraping_utils.page_cache import CachedResponse, OfflineCacheMiss, PageCache
+
+REPORT = 'https://fbref.com/en/matches/abc000/Team0a-Team0b'
+SCHEDULE = 'https://www.basketball-reference.com/leagues/NBA_2023_games-october.html'
+OTHER = 'https://www.basketball-reference.com/players/b/bosplayer00.html'
+
+
+class Clock:
+    # Stands in for time.time, pages expire by moving the clock forward
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class Session:
+    # Answers every url with its page and counts the requests
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requested.append(url)
+        return CachedResponse(url, 200, self.pages[url])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(page_cache.time, 'time', clock.time)
+    return clock
+
+
+def test_pages_expire_by_type(tmp_path, clock):
+    session = Session({url: url.encode('utf-8') for url in [REPORT, SCHEDULE, OTHER]})
+    cache = PageCache(str(tmp_path))
+    for url in [REPORT, SCHEDULE, OTHER]:
+        assert cache.get(url, session=session).content == url.encode('utf-8')
+
+    # Schedules are requested again after 12 hours, other pages after a day, match reports never
+    clock.now += 13 * 3600
+    assert [cache.get(url, session=session).from_cache for url in [REPORT, SCHEDULE, OTHER]] == [True, False, True]
+    clock.now += 11 * 3600
+    assert [cache.get(url, session=session).from_cache for url in [REPORT, SCHEDULE, OTHER]] == [True, True, False]
+    assert session.requested == [REPORT, SCHEDULE, OTHER, SCHEDULE, OTHER]
+
+    # Stale pages can still be used for the ones known not to change anymore
+    clock.now += 30 * 24 * 3600
+    assert cache.cached(SCHEDULE) is None
+    assert cache.cached(SCHEDULE, stale_ok=True).from_cache
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path, clock):
+    # Random pages don't compress, each one takes a bit over 1000 bytes
+    session = Session({url: os.urandom(1000) for url in [REPORT, SCHEDULE, OTHER]})
+    cache = PageCache(str(tmp_path), max_bytes=2500)
+    for url in [REPORT, SCHEDULE]:
+        cache.get(url, session=session)
+        clock.now += 1
+    cache.get(REPORT, session=session)
+    clock.now += 1
+
+    cache.get(OTHER, session=session)
+    assert cache.lookup(SCHEDULE) is None
+    assert cache.lookup(REPORT) is not None and cache.lookup(OTHER) is not None
+    assert cache.total_bytes() <= 2500
+    assert len([name for root, dirs, files in os.walk(tmp_path / 'blobs') for name in files]) == 2
+
+
+def test_offline_misses_raise(tmp_path, clock):
+    session = Session({REPORT: b'report', SCHEDULE: b'schedule'})
+    PageCache(str(tmp_path)).get(SCHEDULE, session=session)
+
+    cache = PageCache(str(tmp_path), offline=True)
+    # Offline every cached copy is used, however old
+    clock.now += 30 * 24 * 3600
+    assert cache.get(SCHEDULE, session=session).content == b'schedule'
+    with pytest.raises(OfflineCacheMiss):
+        cache.get(REPORT, session=session)
+    assert session.requested == [SCHEDULE]
@@ -0,0 +1,67 @@
+from scraping_utils.refresh_planner import RefreshPlanner, schedule_settled
+from conftest import FixtureFetcher, fixture_text, nba_fetcher
+from games_scraper import GamesScraper
+from season_calendar import SeasonCalendar
+from Scraper_FBREF import FBREFScraper, comp_schedule_url
+
+DATES = ['2022-04-01', '2022-04-02', '2022-04-04']
+URL = comp_schedule_url('Copa Libertadores', 2022)
+
+
+class StaleFetcher(FixtureFetcher):
+    # Records whether every page could be read from a stale cached copy
+    def __init__(self, pages):
+        super().__init__(pages)
+        self.stale_ok = []
+
+    def get(self, url, stale_ok=False):
+        self.stale_ok.append(stale_ok)
+        return super().get(url, stale_ok)
+
+
+def test_schedules_settle_days_after_their_last_game():
+    played = [True, True, True]
+    # Corrections can still come in during the settle window
+    assert not schedule_settled(DATES, played, 3, today='2022-04-07')
+    assert schedule_settled(DATES, played, 3, today='2022-04-08')
+    assert schedule_settled(DATES, played, 0, today='2022-04-05')
+    # Schedules with games to be played never settle
+    assert not schedule_settled(DATES, [True, True, False], 3, today='2030-01-01')
+    assert not schedule_settled([], [], 3, today='2030-01-01')
+
+
+def test_planner_requests_unsettled_schedules_again(tmp_path):
+    path = str(tmp_path / 'refresh_plan.json')
+    played_page = fixture_text('fbref_schedule.html').replace('data-stat="score"></td>', 'data-stat="score">1–0</td>')
+    with open(tmp_path / 'played.html', 'w', encoding='utf-8') as f:
+        f.write(played_page)
+
+    # The last match of the schedule is still to be played
+    planner = RefreshPlanner(path, today='2022-05-01')
+    FBREFScraper([2022], ['Copa Libertadores'], fetcher=StaleFetcher({URL: 'fbref_schedule.html'}), planner=planner).get_comp_games('Copa Libertadores', 2022)
+    assert {key: planner.pages[URL][key] for key in ['games', 'played', 'last_played', 'settled']} == \
+        {'games': 5, 'played': 4, 'last_played': '2022-04-04', 'settled': False}
+
+    # Once it is played the schedule settles after the settle window, and is kept in the plan file
+    for today, settled in [('2022-04-07', False), ('2022-04-09', True)]:
+        planner = RefreshPlanner(path, today=today)
+        FBREFScraper([2022], ['Copa Libertadores'], fetcher=StaleFetcher({URL: str(tmp_path / 'played.html')}), planner=planner).get_comp_games('Copa Libertadores', 2022)
+        assert planner.pages[URL]['last_played'] == '2022-04-05'
+        assert planner.settled(URL) == settled
+        planner.save()
+
+    # Later runs read the settled schedule from its cached copy
+    fetcher = StaleFetcher({URL: 'fbref_schedule.html'})
+    FBREFScraper([2022], ['Copa Libertadores'], fetcher=fetcher, planner=RefreshPlanner(path)).get_comp_games('Copa Libertadores', 2022)
+    assert fetcher.stale_ok == [True]
+
+
+def test_months_with_games_to_play_are_requested_again():
+    # Every October game has a box score, one of the November games is still to be played
+    calendar = SeasonCalendar()
+    list(GamesScraper(2023, fetcher=nba_fetcher(), calendar=calendar).iter_games())
+    assert calendar.final(2023) == {'october'}
+
+    fetcher = StaleFetcher(nba_fetcher().pages)
+    list(GamesScraper(2023, fetcher=fetcher, calendar=calendar).iter_games())
+    assert dict(zip([url.split('-')[-1] for url in fetcher.requested], fetcher.stale_ok)) == {'october.html': True, 'november.html': False}
@@ -0,0 +1,51 @@
+import pandas as pd
+from conftest import FixtureFetcher, fbref_fetcher, fixture_text
+from Scraper_FBREF import FBREFScraper, comp_schedule_url, games_with_stats, match_players_frame, players_from_record, select_extractors
+
+
+def test_ages_keep_years_and_days():
+    record = FBREFScraper.parse_stats(fixture_text('fbref_match_report.html').encode('utf-8'), 'https://fbref.com/en/matches/abc000/')
+    games = pd.DataFrame({'Match Report': ['https://fbref.com/en/matches/abc000/']})
+
+    games, match_players = games_with_stats(games, [record], select_extractors())
+
+    raw = {(player['side'], player['role'], player['slot']): player['age'] for player in record['players']}
+    ages = {(row.side, row.role, row.slot): f'{row.age}-{row.age_days:03d}' for row in match_players.itertuples()}
+    assert ages == raw
+    assert match_players['age'].dtype == 'Int16' and match_players['age_days'].dtype == 'Int16'
+    assert f"{games.loc[0, 'starting_age_home1']}-{games.loc[0, 'starting_age_days_home1']:03d}" == raw[('home', 'starting', 1)]
+
+
+def test_ages_of_old_records():
+    # Checkpoint entries written before the long format keep the lineups as wide columns, ages as fbref shows them
+    players = players_from_record({'starting_name_home1': 'A', 'starting_age_home1': '25-010', 'bench_name_away2': 'B', 'bench_age_away2': '31'})
+    frame = match_players_frame([dict(player, match_id='abc000') for player in players])
+
+    assert frame['age'].tolist() == [25, 31]
+    assert frame['age_days'].tolist() == [10, pd.NA]
+
+
+def test_shootout_scores():
+    url = comp_schedule_url('Copa Libertadores', 2022)
+    games = FBREFScraper([2022], ['Copa Libertadores'], fetcher=FixtureFetcher({url: 'fbref_schedule.html'})).get_comp_games('Copa Libertadores', 2022)
+
+    # (4) 0–0 (3) was drawn in regulation and decided on penalties
+    shootout = games[games['Score'] == '(4) 0–0 (3)'].iloc[0]
+    assert (shootout['HomeGoals'], shootout['AwayGoals'], shootout['HomePenalties'], shootout['AwayPenalties']) == (0, 0, 4, 3)
+    assert games['HomeGoals'].tolist()[:4] == [1, 2, 0, 3]
+    assert games['HomePenalties'].notna().sum() == 1
+    assert games.dtypes[['HomeGoals', 'AwayGoals', 'HomePenalties', 'AwayPenalties']].eq('Int8').all()
+
+
+def test_shootout_reports_are_scraped():
+    fetcher = fbref_fetcher()
+    scraper = FBREFScraper([2022], ['Copa Libertadores'], fetcher=fetcher)
+
+    scraper.run()
+
+    # The schedule and the reports of the 4 played matches, the shootout included. The fixture has no report yet
+    assert len(fetcher.requested) == 5
+    assert set(fetcher.requested) <= set(fetcher.pages)
+    played = scraper.games['Score'].notna()
+    assert scraper.games.loc[played, 'manager_home'].notna().all()
+    assert scraper.games.loc[~played, 'manager_home'].isna().all()
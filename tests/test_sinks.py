@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+from scraping_utils.sinks import open_sink
+
+CHUNKS = [
+    pd.DataFrame({'player': ['A', 'B'], 'PTS': [10, 12]}),
+    pd.DataFrame({'player': ['C'], 'PTS': [3], 'BPM': [1.5]}),
+    pd.DataFrame({'player': ['D'], 'reason': ['Did Not Play']}),
+    pd.DataFrame({'player': ['E'], 'PTS': [7], 'BPM': [-2.0]}),
+]
+
+
+@pytest.mark.parametrize('name', ['out.csv', 'out.parquet'])
+def test_later_columns_are_kept(tmp_path, name):
+    path = str(tmp_path / name)
+    sink = open_sink(path)
+    for chunk in CHUNKS:
+        sink.write(chunk)
+    sink.close()
+
+    df = pd.read_parquet(path) if name.endswith('.parquet') else pd.read_csv(path)
+    assert list(df.columns) == ['player', 'PTS', 'BPM', 'reason']
+    assert df['player'].tolist() == ['A', 'B', 'C', 'D', 'E']
+    assert df['PTS'].tolist()[:3] == [10, 12, 3] and pd.isna(df['PTS'][3])
+    assert df['BPM'].isna().tolist() == [True, True, False, True, False]
+    assert df['reason'].isna().tolist() == [True, True, True, False, True]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [name]
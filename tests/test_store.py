@@ -0,0 +1,37 @@
+import pandas as pd
+from scraping_utils.store import SqliteStore
+
+GAMES = pd.DataFrame({'Match Report': ['/m/a', '/m/b', '/m/c'], 'league': ['Copa', 'Copa', 'Liga'],
+                      'season': [2022, 2022, 2023], 'Home': ['A', 'B', 'C'], 'HomeGoals': [1, 0, 2]})
+
+
+def test_upsert_writes_only_new_and_changed_rows(tmp_path):
+    store = SqliteStore(str(tmp_path / 'games.sqlite'))
+    assert store.upsert('fbref_games', GAMES) == 3
+    hashes = dict(store.db.execute('SELECT "Match Report", _hash FROM fbref_games').fetchall())
+
+    # The same rows again leave the table as it is
+    assert store.upsert('fbref_games', GAMES) == 0
+    assert dict(store.db.execute('SELECT "Match Report", _hash FROM fbref_games').fetchall()) == hashes
+
+    # Only the row whose values changed is updated
+    changed = GAMES.copy()
+    changed.loc[1, 'HomeGoals'] = 3
+    assert store.upsert('fbref_games', changed) == 1
+    games = store.query('SELECT "Match Report", HomeGoals, _hash FROM fbref_games ORDER BY "Match Report"')
+    assert games['HomeGoals'].tolist() == [1, 3, 2]
+    assert [games['_hash'][i] == hashes[url] for i, url in enumerate(games['Match Report'])] == [True, False, True]
+    store.close()
+
+
+def test_lookups_use_the_indexes(tmp_path):
+    store = SqliteStore(str(tmp_path / 'games.sqlite'))
+    store.upsert('fbref_games', GAMES)
+
+    def plan(sql):
+        return ' '.join(store.query('EXPLAIN QUERY PLAN ' + sql)['detail'])
+
+    # The conflicts of the upsert are found through the primary key, queries by season through their index
+    assert 'USING INDEX sqlite_autoindex_fbref_games_1' in plan('SELECT _hash FROM fbref_games WHERE "Match Report" = \'/m/a\'')
+    assert 'USING INDEX fbref_games_league_season' in plan('SELECT * FROM fbref_games WHERE league = \'Copa\' AND season = 2022')
+    store.close()
@@ -0,0 +1,96 @@
+import pytest
+from scraping_utils import work_queue
+from scraping_utils.work_queue import WorkQueue, shard_of
+from batch_scraper import merged_results
+
+TASKS = [('boxscore', f'/boxscores/{i}.html', {'i': i}) for i in range(6)]
+
+
+class Clock:
+    # Stands in for time.time, leases expire by moving the clock forward
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), lease=60, max_attempts=3)
+    yield queue
+    queue.close()
+
+
+def status(queue, url):
+    return queue.db.execute('SELECT status, attempts FROM tasks WHERE url = ?', (url,)).fetchone()
+
+
+def test_claim_earlier_stages_first(queue):
+    queue.add(TASKS[:2], stage=1)
+    queue.add(TASKS[2:4], shard=1)
+    assert queue.add(TASKS[2:4]) == 0
+
+    assert [task['url'] for task in queue.claim('w1', limit=3)] == ['/boxscores/2.html', '/boxscores/3.html', '/boxscores/0.html']
+    assert [task['url'] for task in queue.claim('w2')] == ['/boxscores/1.html']
+    # Leased tasks aren't claimed by other workers
+    assert queue.claim('w3') == []
+
+    queue.release('w1')
+    assert [task['url'] for task in queue.claim('w3', shard=1)] == ['/boxscores/2.html', '/boxscores/3.html']
+
+
+def test_expired_leases_count_as_attempts(queue, clock):
+    url = TASKS[0][1]
+    queue.add(TASKS[:1])
+    for attempt in range(3):
+        assert [task['url'] for task in queue.claim('w1')] == [url]
+        assert queue.claim('w2') == []
+        # The worker died with the task, it is claimed again once the lease expires
+        clock.now += 61
+
+    # A task that keeps killing its worker is given up after max_attempts
+    assert queue.claim('w2') == []
+    assert status(queue, url) == ('failed', 3)
+
+
+def test_fail_retries_until_max_attempts(queue):
+    queue.add(TASKS[:2])
+    queue.claim('w1')
+    queue.fail(TASKS[0][1], 'timeout')
+    queue.fail(TASKS[1][1], 'status 404', 404)
+    assert status(queue, TASKS[0][1]) == ('pending', 1)
+    # Pages that don't exist are given up at once
+    assert status(queue, TASKS[1][1]) == ('failed', 1)
+
+    for attempt in range(2):
+        assert [task['url'] for task in queue.claim('w1')] == [TASKS[0][1]]
+        queue.fail(TASKS[0][1], 'timeout')
+    assert status(queue, TASKS[0][1]) == ('failed', 3)
+    assert queue.claim('w1') == []
+
+
+def test_shards_merge(tmp_path):
+    # Every machine works its shards on a copy of the planned queue, the merge reads the results of all of them
+    assert {shard_of(url, 2) for kind, url, args in TASKS} == {0, 1}
+    queues = [WorkQueue(str(tmp_path / f'queue{n}.sqlite')) for n in range(2)]
+    for n, queue in enumerate(queues):
+        queue.set_meta('shards', 2)
+        queue.add(TASKS)
+        for task in queue.claim(f'w{n}', shard=n):
+            queue.complete(task['url'], {'shard': n})
+    # A task finished on both machines keeps the result of the first queue
+    queues[1].complete(TASKS[0][1], {'shard': 'again'})
+
+    results = merged_results(queues, 'boxscore')
+    assert sorted(results) == sorted(url for kind, url, args in TASKS)
+    assert {url: result['shard'] for url, result in results.items()} == {url: shard_of(url, 2) for kind, url, args in TASKS}
+    for queue in queues:
+        queue.close()